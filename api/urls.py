@@ -0,0 +1,12 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('events/', views.event_list, name='api_events'),
+    path('events/<slug:slug>/', views.event_detail, name='api_event_detail'),
+    path('tours/', views.tour_list, name='api_tours'),
+    path('tours/<slug:slug>/', views.tour_detail, name='api_tour_detail'),
+    path('cities/', views.city_list, name='api_cities'),
+    path('event-types/', views.event_type_list, name='api_event_types'),
+    path('faq/', views.faq_list, name='api_faq'),
+]
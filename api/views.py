@@ -0,0 +1,261 @@
+"""
+Версионированный JSON API только для чтения (/api/v1/).
+
+Ответы строятся из легких выборок values() и сериализуются orjson.
+Каждый ответ получает сильный ETag из времени последнего изменения и количества
+записей выборки (один агрегирующий запрос) и версий связанных данных, поэтому
+повторный запрос с If-None-Match получает 304 без выборки строк.
+"""
+import hashlib
+
+import orjson
+from django.db.models import Count, F, Max, Q
+from django.http import Http404, HttpResponse
+from django.utils import timezone
+from django.views.decorators.http import condition, require_safe
+
+from core.caching import get_versions
+from core.pagination import get_int_param, keyset_page
+from core.projections import media_url
+from events.models import City, Event, EventStatus, EventType
+from faq.models import Question
+from tours.models import Tour, attach_city_names
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+class BadRequest(Exception):
+    """Некорректные параметры запроса"""
+
+
+def json_response(data, status=200):
+    response = HttpResponse(orjson.dumps(data), content_type='application/json', status=status)
+    # Клиент может хранить ответ, но перед использованием должен проверить его по ETag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def data_etag(request, queryset=None, groups=(), extra=(), archived=False):
+    """
+    ETag ответа: адрес запроса, версии групп данных и, если передана выборка,
+    время последнего изменения и количество ее записей.
+    С archived=True учитывается и количество мероприятий выборки, ушедших в архив:
+    уход в архив не меняет updated_at, но меняет ответ (is_past, прошедшие мероприятия тура)
+    """
+    parts = [request.get_full_path(), str(sorted(get_versions(*groups).items())), *map(str, extra)]
+    if queryset is not None:
+        aggregates = {'last': Max('updated_at'), 'count': Count('pk')}
+        if archived:
+            aggregates['archived'] = Count('pk', filter=Q(archive_at__lt=timezone.now()))
+        state = queryset.order_by().aggregate(**aggregates)
+        parts += [str(value) for _, value in sorted(state.items())]
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def event_card(request, event):
+    """Карточка мероприятия в ответе API"""
+    return {
+        'id': event['pk'],
+        'slug': event['slug'],
+        'title': event['title'],
+        'date': event['date'],
+        'time': event['time'],
+        'venue': event['venue'],
+        'city': {'id': event['city_id'], 'name': event['city_name']},
+        'url': request.build_absolute_uri(event['url']),
+        'poster_url': request.build_absolute_uri(event['poster_url']),
+    }
+
+
+def get_page_size(request):
+    limit = get_int_param(request, 'limit') or DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def events_queryset(request):
+    """Выборка мероприятий по параметрам when (upcoming/past), city и type"""
+    when = request.GET.get('when', 'upcoming')
+    if when == 'upcoming':
+        events = Event.objects.upcoming()
+    elif when == 'past':
+        events = Event.objects.past()
+    else:
+        raise BadRequest('Параметр when должен быть upcoming или past')
+
+    city_id = get_int_param(request, 'city')
+    if city_id:
+        events = events.filter(city_id=city_id)
+    type_id = get_int_param(request, 'type')
+    if type_id:
+        events = events.filter(event_type_id=type_id)
+    return when, events
+
+
+def events_etag(request):
+    try:
+        _, events = events_queryset(request)
+    except BadRequest:
+        return None
+    return data_etag(request, events, ('events',))
+
+
+@require_safe
+@condition(etag_func=events_etag)
+def event_list(request):
+    """Предстоящие или прошедшие мероприятия с постраничным выводом по курсору"""
+    try:
+        when, events = events_queryset(request)
+    except BadRequest as error:
+        return json_response({'error': str(error)}, status=400)
+
+    items, next_cursor = keyset_page(
+        events.cards(), request.GET.get('after'), get_page_size(request), descending=(when == 'past'),
+    )
+    return json_response({
+        'results': [event_card(request, event) for event in items],
+        'next': next_cursor,
+    })
+
+
+def visible_events():
+    # Черновики не публикуются
+    return Event.objects.exclude(status=EventStatus.DRAFT)
+
+
+def event_detail_etag(request, slug):
+    return data_etag(request, visible_events().filter(slug=slug), ('events',), archived=True)
+
+
+@require_safe
+@condition(etag_func=event_detail_etag)
+def event_detail(request, slug):
+    """Мероприятие со всеми публичными полями"""
+    event = visible_events().filter(slug=slug).cards().values(
+        'pk', 'slug', 'title', 'date', 'time', 'venue', 'city_id', 'city_name', 'url', 'poster_url',
+        'address', 'description', 'status', 'archive_at', 'ticket_system', 'ticket_link', 'vk_link',
+        timezone_name=F('city__timezone'),
+        event_type_name=F('event_type__name'),
+        age_restriction_name=F('age_restriction__name'),
+        cover_url=media_url('cover'),
+    ).first()
+    if event is None:
+        raise Http404
+
+    data = event_card(request, event)
+    data.update({
+        'timezone': event['timezone_name'],
+        'address': event['address'],
+        'description': event['description'],
+        'event_type': event['event_type_name'],
+        'age_restriction': event['age_restriction_name'],
+        'status': event['status'],
+        'is_past': event['archive_at'] is not None and event['archive_at'] < timezone.now(),
+        'ticket_system': event['ticket_system'],
+        'ticket_link': event['ticket_link'],
+        'vk_link': event['vk_link'],
+        'cover_url': request.build_absolute_uri(event['cover_url']),
+    })
+    return json_response(data)
+
+
+def active_tours():
+    return Tour.objects.filter(is_active=True).with_upcoming_events()
+
+
+def tour_list_etag(request):
+    return data_etag(request, active_tours(), ('events', 'tours'))
+
+
+@require_safe
+@condition(etag_func=tour_list_etag)
+def tour_list(request):
+    """Активные туры, у которых есть предстоящие мероприятия"""
+    tours = attach_city_names(list(active_tours().order_by('-created_at').cards()))
+    return json_response({
+        'results': [
+            {
+                'id': tour['pk'],
+                'slug': tour['slug'],
+                'title': tour['title'],
+                'cities': tour['city_names'],
+                'url': request.build_absolute_uri(tour['url']),
+                'poster_url': request.build_absolute_uri(tour['poster_url']),
+            }
+            for tour in tours
+        ],
+    })
+
+
+def tour_events(slug):
+    return Event.objects.filter(status=EventStatus.ACTIVE, tour_events__tour__slug=slug, tour_events__tour__is_active=True)
+
+
+def tour_detail_etag(request, slug):
+    # Учитываются и сам тур, и его мероприятия
+    tour_updated_at = Tour.objects.filter(slug=slug, is_active=True).values_list('updated_at', flat=True).first()
+    return data_etag(request, tour_events(slug), ('events', 'tours'), extra=[tour_updated_at], archived=True)
+
+
+@require_safe
+@condition(etag_func=tour_detail_etag)
+def tour_detail(request, slug):
+    """Тур с предстоящими и прошедшими мероприятиями"""
+    tour = Tour.objects.filter(slug=slug, is_active=True).cards().first()
+    if tour is None:
+        raise Http404
+
+    now = timezone.now()
+    upcoming = []
+    past = []
+    for event in tour_events(slug).order_by('date', 'time').cards():
+        if event['archive_at'] is not None and event['archive_at'] < now:
+            past.append(event_card(request, event))
+        else:
+            upcoming.append(event_card(request, event))
+
+    return json_response({
+        'id': tour['pk'],
+        'slug': tour['slug'],
+        'title': tour['title'],
+        'url': request.build_absolute_uri(tour['url']),
+        'poster_url': request.build_absolute_uri(tour['poster_url']),
+        'events': upcoming,
+        'past_events': past,
+    })
+
+
+def city_list_etag(request):
+    return data_etag(request, groups=('cities', 'events'))
+
+
+@require_safe
+@condition(etag_func=city_list_etag)
+def city_list(request):
+    """Города с часовыми поясами"""
+    cities = City.objects.order_by('name').values('id', 'name', 'timezone')
+    return json_response({'results': list(cities)})
+
+
+def event_type_list_etag(request):
+    return data_etag(request, groups=('events',))
+
+
+@require_safe
+@condition(etag_func=event_type_list_etag)
+def event_type_list(request):
+    """Типы мероприятий"""
+    event_types = EventType.objects.order_by('name').values('id', 'name')
+    return json_response({'results': list(event_types)})
+
+
+def faq_etag(request):
+    return data_etag(request, Question.objects.all(), ('faq',))
+
+
+@require_safe
+@condition(etag_func=faq_etag)
+def faq_list(request):
+    """Часто задаваемые вопросы"""
+    questions = Question.objects.order_by('position').values('id', 'title', 'content')
+    return json_response({'results': list(questions)})
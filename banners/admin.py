@@ -1,15 +1,15 @@
 from django.contrib import admin
 from .models import Banner
 from django.contrib import messages
-from django.core.files.base import ContentFile
 from django.utils.html import format_html
-import uuid
-import os
-import shutil
-from django.conf import settings
+from django.db import transaction
+from core.caching import bump_version
+from core.admin import ImageVariantsAdminMixin
+from core.images import admin_preview
+from core.models import acquire_file_references
 
 @admin.register(Banner)
-class BannerAdmin(admin.ModelAdmin):
+class BannerAdmin(ImageVariantsAdminMixin, admin.ModelAdmin):
     list_display = ['preview_image', 'link', 'position', 'get_colored_status']
     list_filter = ['is_active', 'created_at']
     list_editable = ['position']
@@ -44,14 +44,14 @@ class BannerAdmin(admin.ModelAdmin):
     def preview_image(self, obj):
         """Показывает маленькое превью изображения в списке"""
         if obj.cover:
-            return format_html('<img src="{}" style="max-height: 50px;"/>', obj.cover.url)
+            return admin_preview(obj.cover, 'cover', 50)
         return "Нет изображения"
     preview_image.short_description = 'Превью'
 
     def preview_image_large(self, obj):
         """Показывает большое превью изображения в форме редактирования"""
         if obj.cover:
-            return format_html('<img src="{}" style="max-height: 200px;"/>', obj.cover.url)
+            return admin_preview(obj.cover, 'cover', 200)
         return "Нет изображения"
     preview_image_large.short_description = 'Предпросмотр баннера'
     
@@ -74,43 +74,26 @@ class BannerAdmin(admin.ModelAdmin):
     
     def duplicate_banner(self, request, queryset):
         """Действие для дублирования выбранных баннеров"""
+        copies = []
         for banner in queryset:
-            # Запоминаем путь к изображению
-            cover_path = None
-            
-            if banner.cover and hasattr(banner.cover, 'path'):
-                cover_path = banner.cover.path
-            
-            # Создаем копию баннера
+            # Создаем копию баннера. Изображение не копируется: копия ссылается на тот же файл,
+            # а учет ссылок на него ведет core.StoredFile
             banner.pk = None
             
-            # Временно очищаем поле изображения
-            original_cover = banner.cover
-            banner.cover = None
             banner.is_active = False  # Новая копия всегда неактивна
+            copies.append(banner)
+        
+        with transaction.atomic():
+            # Сохраняем все копии одним запросом
+            Banner.objects.bulk_create(copies)
             
-            # Сохраняем новый баннер
-            banner.save()
-            
-            # Копируем изображение
-            if cover_path and os.path.exists(cover_path):
-                self._copy_image(cover_path, banner)
+            # Сигналы при массовом создании не отправляются: учитываем ссылки на файлы и сбрасываем кэши сами
+            acquire_file_references(copies)
+            bump_version('banners')
             
-        messages.success(request, f"Успешно создано {queryset.count()} копий баннеров")
+        messages.success(request, f"Успешно создано {len(copies)} копий баннеров")
     duplicate_banner.short_description = "Дублировать выбранные баннеры"
     
-    def _copy_image(self, source_path, banner):
-        filename, ext = os.path.splitext(os.path.basename(source_path))
-        new_filename = f"{uuid.uuid4().hex}{ext}"
-        new_relative_path = os.path.join('banners', new_filename)
-        new_full_path = os.path.join(settings.MEDIA_ROOT, 'banners', new_filename)
-        
-        os.makedirs(os.path.dirname(new_full_path), exist_ok=True)
-        shutil.copy2(source_path, new_full_path)
-        
-        banner.cover = new_relative_path
-        banner.save()
-
     def get_colored_status(self, obj):
         """Отображает статус баннера с соответствующим цветом"""
         if obj.is_active:
@@ -1,6 +1,8 @@
 from django.db import models
-from django.db.models.signals import pre_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from core.caching import bump_version, VersionedQuerySet
+from core.models import ImageFilesMixin, remember_file_names, update_file_references, release_file_references
 import os
 import uuid
 
@@ -10,7 +12,11 @@ def get_random_image_path(instance, filename):
     random_filename = f"{uuid.uuid4().hex}.{ext}"
     return os.path.join('banners', random_filename)
 
-class Banner(models.Model):
+class BannerQuerySet(VersionedQuerySet):
+    """Выборки баннеров"""
+    version_groups = ('banners',)
+
+class Banner(ImageFilesMixin, models.Model):
     """Модель баннера на главной странице"""
     cover = models.ImageField(upload_to=get_random_image_path, verbose_name="Изображение баннера")
     link = models.CharField(max_length=255, verbose_name="Ссылка")
@@ -19,6 +25,11 @@ class Banner(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     
+    objects = BannerQuerySet.as_manager()
+    
+    # Поля изображений и виды их адаптивных вариантов (см. core.images)
+    image_variants = {'cover': 'cover'}
+    
     class Meta:
         verbose_name = "Баннер"
         verbose_name_plural = "Баннеры"
@@ -26,32 +37,27 @@ class Banner(models.Model):
     
     def __str__(self):
         return f"Баннер #{self.id} ({self.position})"
-        
-    def delete_old_image(self, field_name):
-        """Удаляет старое изображение, если оно было заменено"""
-        try:
-            # Получаем путь к старому файлу
-            old_instance = Banner.objects.get(pk=self.pk)
-            old_file = getattr(old_instance, field_name)
-            if old_file and old_file != getattr(self, field_name):
-                if os.path.isfile(old_file.path):
-                    os.remove(old_file.path)
-        except (Banner.DoesNotExist, ValueError, FileNotFoundError):
-            # Если объект новый или файл не найден, ничего не делаем
-            pass
 
-# Сигнал для обработки удаления старых изображений при обновлении
+# Сигнал для запоминания прежних изображений перед обновлением
 @receiver(pre_save, sender=Banner)
-def delete_old_images_on_update(sender, instance, **kwargs):
-    """Обработчик сигнала, который удаляет старые изображения при обновлении баннера"""
-    if instance.pk:  # Если объект уже существует (не создание нового)
-        instance.delete_old_image('cover')
+def remember_old_images(sender, instance, **kwargs):
+    """Обработчик сигнала, который запоминает прежние изображения баннера"""
+    remember_file_names(instance)
 
-# Сигнал для обработки удаления файлов при удалении объекта
+# Сигнал для учета ссылок на изображения и создания их адаптивных вариантов
+@receiver(post_save, sender=Banner)
+def update_images_on_save(sender, instance, created, **kwargs):
+    """Обработчик сигнала, который освобождает замененные изображения баннера и ставит в очередь создание вариантов новых"""
+    update_file_references(instance, created)
+
+# Сигнал для освобождения файлов при удалении объекта
 @receiver(post_delete, sender=Banner)
-def delete_files_on_delete(sender, instance, **kwargs):
-    """Обработчик сигнала, который удаляет файлы при удалении баннера"""
-    # Удаляем файл обложки, если он существует
-    if instance.cover:
-        if os.path.isfile(instance.cover.path):
-            os.remove(instance.cover.path)
+def release_files_on_delete(sender, instance, **kwargs):
+    """Обработчик сигнала, который освобождает изображения удаленного баннера"""
+    release_file_references(instance)
+
+# Сигнал для инвалидации кэша при изменении баннеров
+@receiver([post_save, post_delete], sender=Banner)
+def bump_banners_version(sender, **kwargs):
+    """Обработчик сигнала, который сбрасывает кэши, зависящие от баннеров"""
+    bump_version('banners')
@@ -1,12 +1,25 @@
 from django.contrib import admin
 from .models import SiteInfo
 from django.contrib.admin import AdminSite
+from .images import ready_formats_many
 
 # Настройка общего вида админки
 admin.site.site_header = "ElemEvent Админ-панель"
 admin.site.site_title = "ElemEvent"
 admin.site.index_title = "Управление сайтом"
 
+class ImageVariantsAdminMixin:
+    """Загружает форматы вариантов для превью всей страницы списка одним запросом"""
+    
+    def get_changelist_instance(self, request):
+        changelist = super().get_changelist_instance(request)
+        ready_formats_many(
+            getattr(obj, field_name).name
+            for obj in changelist.result_list
+            for field_name in self.model.image_variants
+        )
+        return changelist
+
 @admin.register(SiteInfo)
 class SiteInfoAdmin(admin.ModelAdmin):
     list_display = ['company_name', 'email', 'updated_at']
@@ -0,0 +1,28 @@
+"""
+Выполнение коротких служебных операций (например, удаления файлов) вне потока запроса.
+
+Задачи выполняются пулом потоков процесса; ответ администратору не ждет
+их завершения. Пул дожидается оставшихся задач при завершении процесса.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Файловые операции упираются в диск, а не в процессор, поэтому хватает пары потоков
+BACKGROUND_WORKERS = 2
+
+_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix='background')
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error('Ошибка фоновой задачи', exc_info=(type(error), error, error.__traceback__))
+
+
+def run_in_background(func, *args, **kwargs):
+    """Ставит функцию в очередь фонового выполнения"""
+    future = _executor.submit(func, *args, **kwargs)
+    future.add_done_callback(_log_failure)
+    return future
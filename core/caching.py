@@ -0,0 +1,162 @@
+"""
+Версии данных для инвалидации кэша.
+
+Каждая группа данных (events, tours, faq, ...) имеет собственный счетчик версии,
+который увеличивается при изменении моделей. Ключи кэша содержат текущие версии,
+поэтому после изменения данных старые записи просто перестают использоваться
+и вытесняются из кэша по истечении срока жизни.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+VERSION_KEY_PREFIX = 'version:'
+
+
+def _version_key(name):
+    return f'{VERSION_KEY_PREFIX}{name}'
+
+
+def _initial_version():
+    # Начальная версия зависит от времени, чтобы после потери счетчика
+    # не совпасть с версией уже закэшированных устаревших данных
+    return int(time.time() * 1000)
+
+
+def get_versions(*names):
+    """Возвращает словарь {группа: версия} одним запросом к кэшу"""
+    keys = {name: _version_key(name) for name in names}
+    stored = cache.get_many(keys.values())
+
+    versions = {}
+    for name, key in keys.items():
+        version = stored.get(key)
+        if version is None:
+            version = _initial_version()
+            # add() не перезапишет версию, если ее успел создать другой процесс
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        versions[name] = version
+    return versions
+
+
+def get_version(name):
+    """Возвращает текущую версию группы данных"""
+    return get_versions(name)[name]
+
+
+def bump_version(*names):
+    """
+    Увеличивает версии групп данных, сбрасывая зависящие от них записи кэша.
+    Внутри транзакции версии увеличиваются после ее фиксации: иначе параллельный
+    запрос успел бы закэшировать еще не измененные данные под новой версией.
+    """
+    transaction.on_commit(lambda: _increment_versions(names))
+
+
+def _increment_versions(names):
+    for name in names:
+        key = _version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Счетчика еще нет в кэше
+            cache.set(key, _initial_version(), None)
+
+
+def versioned_key(prefix, *names):
+    """Формирует ключ кэша, включающий версии перечисленных групп данных"""
+    versions = get_versions(*names)
+    suffix = '.'.join(f'{name}{versions[name]}' for name in names)
+    return f'{prefix}:{suffix}'
+
+
+class VersionedQuerySet(models.QuerySet):
+    """
+    QuerySet, который увеличивает версии групп данных при массовом update().
+    update() не отправляет сигналы моделей, поэтому инвалидация выполняется здесь.
+    """
+    version_groups = ()
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        if rows:
+            bump_version(*self.version_groups)
+        return rows
+
+
+def timeout_until(moment, default):
+    """
+    Возвращает время жизни записи кэша в секундах: до указанного момента,
+    но не больше default. Если момент не задан, возвращает default.
+    """
+    if moment is None:
+        return default
+    seconds = int((moment - timezone.now()).total_seconds())
+    return max(0, min(default, seconds))
+
+
+def expire_at(request, *moments):
+    """
+    Сообщает кэшу страницы моменты, когда ее содержимое устареет без изменения данных
+    (например, когда показанное мероприятие уйдет в архив). Учитывается самый ранний.
+    """
+    for moment in moments:
+        if moment is None:
+            continue
+        current = getattr(request, '_cache_expires_at', None)
+        if current is None or moment < current:
+            request._cache_expires_at = moment
+
+
+# Группы данных, от которых зависят публичные страницы сайта
+PAGE_VERSION_GROUPS = ('events', 'tours', 'banners', 'faq', 'site', 'images')
+
+
+def _page_cache_key(request):
+    url = f'{request.get_host()}{request.get_full_path()}'
+    digest = hashlib.md5(url.encode()).hexdigest()
+    return f'{versioned_key("page", *PAGE_VERSION_GROUPS)}:{digest}'
+
+
+def cache_public_page(view_func):
+    """
+    Кэширует ответы публичных страниц для анонимных посетителей.
+    Ключ зависит от адреса с параметрами запроса и от версий данных,
+    поэтому любое изменение моделей сбрасывает закэшированные страницы.
+    Запись живет не дольше ближайшего момента, переданного представлением в expire_at().
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+            return view_func(request, *args, **kwargs)
+
+        key = _page_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type, headers = cached
+            response = HttpResponse(content, content_type=content_type)
+            for header, value in headers.items():
+                response[header] = value
+            return response
+
+        response = view_func(request, *args, **kwargs)
+
+        # Кэшируем только успешные ответы без установки cookies
+        if response.status_code == 200 and not response.streaming and not response.cookies:
+            timeout = timeout_until(getattr(request, '_cache_expires_at', None), settings.PAGE_CACHE_TIMEOUT)
+            if timeout > 0:
+                headers = {
+                    header: value for header, value in response.items()
+                    if header.lower().startswith('x-') or header.lower() == 'last-modified'
+                }
+                cache.set(key, (response.content, response['Content-Type'], headers), timeout)
+        return response
+
+    return wrapper
@@ -1,14 +1,24 @@
+from django.utils.functional import SimpleLazyObject
 from .models import SiteInfo
+from .navigation import get_navigation
+from .caching import expire_at
 
 def site_info(request):
-    """Добавляет информацию о сайте во все шаблоны"""
-    try:
-        site_info = SiteInfo.objects.first()
-        if not site_info:
-            site_info = SiteInfo.objects.create()
-    except:
-        site_info = None
-    
+    """Добавляет информацию о сайте во все шаблоны (загружается только при обращении)"""
     return {
-        'site_info': site_info
-    } 
\ No newline at end of file
+        'site_info': SimpleLazyObject(SiteInfo.load)
+    }
+
+def navigation(request):
+    """Добавляет во все шаблоны данные для меню (вычисляются только при обращении)"""
+    def load():
+        nav = get_navigation()
+        # Страница с меню устаревает вместе с его флагами
+        expire_at(request, nav['expires_at'])
+        return nav
+
+    return {
+        'nav': SimpleLazyObject(load),
+        # Вместо адреса страницы в ключ кэша меню попадает только этот флаг
+        'is_index': request.path == '/',
+    }
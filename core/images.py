@@ -0,0 +1,211 @@
+"""
+Адаптивные варианты загруженных изображений.
+
+Для каждого изображения рядом с оригиналом сохраняются уменьшенные копии в WebP
+(и в AVIF, если включено IMAGE_VARIANTS_AVIF и Pillow поддерживает формат):
+events/cards/abc.jpg -> events/cards/abc.320w.webp, events/cards/abc.640w.webp, ...
+Имена вариантов вычисляются из имени оригинала. Варианты создаются в фоновой
+задаче, поэтому форматы готовых вариантов записываются в StoredFile.variants
+(с копией в кэше), и в разметку попадают только существующие файлы.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+from PIL import Image, ImageOps, features
+
+from jobs.queue import task
+from .caching import bump_version
+
+# Ширины вариантов (пиксели) для каждого вида изображений
+VARIANT_WIDTHS = {
+    'card': (160, 320, 640, 960),
+    'cover': (160, 640, 1280, 1920),
+}
+
+# Подсказки браузеру о ширине изображения на странице
+VARIANT_SIZES = {
+    'card': '(min-width: 1024px) 25vw, (min-width: 768px) 33vw, (min-width: 640px) 50vw, 100vw',
+    'cover': '100vw',
+}
+
+# Все форматы, которые могут встретиться среди вариантов (для удаления)
+ALL_FORMATS = ('avif', 'webp')
+
+QUALITY = {'avif': 60, 'webp': 80}
+
+# Время жизни записи кэша с форматами готовых вариантов (секунды)
+READY_FORMATS_TIMEOUT = 24 * 60 * 60
+# Время жизни записи кэша для изображения, варианты которого еще не созданы
+PENDING_FORMATS_TIMEOUT = 60
+
+
+def variant_formats():
+    """Форматы создаваемых вариантов в порядке предпочтения браузером"""
+    formats = []
+    if getattr(settings, 'IMAGE_VARIANTS_AVIF', False) and features.check('avif'):
+        formats.append('avif')
+    formats.append('webp')
+    return formats
+
+
+def image_name(image):
+    """Имя файла из FieldFile или строки"""
+    return getattr(image, 'name', image) or ''
+
+
+def variant_name(name, width, fmt):
+    """Имя варианта изображения заданной ширины и формата"""
+    root, _ = os.path.splitext(name)
+    return f'{root}.{width}w.{fmt}'
+
+
+def variant_names(name, kind, formats=ALL_FORMATS):
+    """Имена всех возможных вариантов изображения"""
+    return [variant_name(name, width, fmt) for width in VARIANT_WIDTHS[kind] for fmt in formats]
+
+
+def _ready_formats_key(name):
+    return f'variants:{name}'
+
+
+def ready_formats_many(names):
+    """
+    Форматы готовых вариантов для нескольких изображений: {имя: [формат, ...]}.
+    Записи берутся из кэша одним запросом, недостающие - из БД тоже одним запросом.
+    """
+    from .models import StoredFile
+
+    keys = {_ready_formats_key(name): name for name in names if name}
+    values = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = [name for name in keys.values() if name not in values]
+    if missing:
+        stored = dict(StoredFile.objects.filter(name__in=missing).values_list('name', 'variants'))
+        found = {name: stored.get(name, '') for name in missing}
+        values.update(found)
+        # Пустое значение запоминается ненадолго: варианты создаст фоновая задача,
+        # а при кэше в памяти процесса ее запись в кэш сюда не попадет
+        cache.set_many({_ready_formats_key(name): value for name, value in found.items() if value}, READY_FORMATS_TIMEOUT)
+        cache.set_many({_ready_formats_key(name): value for name, value in found.items() if not value}, PENDING_FORMATS_TIMEOUT)
+    return {name: value.split(',') if value else [] for name, value in values.items()}
+
+
+def ready_formats(name):
+    """Форматы, в которых варианты изображения уже созданы"""
+    return ready_formats_many([name]).get(name, [])
+
+
+def record_variants(name, formats):
+    """Записывает форматы созданных вариантов изображения"""
+    from .models import StoredFile
+
+    value = ','.join(formats)
+    stored, created = StoredFile.objects.get_or_create(name=name, defaults={'variants': value})
+    if not created:
+        if stored.variants == value:
+            return
+        StoredFile.objects.filter(pk=stored.pk).update(variants=value)
+    cache.set(_ready_formats_key(name), value, READY_FORMATS_TIMEOUT)
+    # Закэшированная разметка выводила изображение без вариантов; группа images
+    # сбрасывает только ее, не затрагивая кэш, зависящий от самих мероприятий
+    bump_version('images')
+
+
+def forget_variants(name):
+    """Сбрасывает закэшированные форматы вариантов удаленного изображения"""
+    cache.delete(_ready_formats_key(name))
+
+
+def save_as(name, content):
+    """Сохраняет файл точно под указанным именем, заменяя существующий"""
+    if hasattr(default_storage, 'save_as'):
+        return default_storage.save_as(name, content)
+    # Обычное хранилище переименовывает файл при совпадении имен, поэтому старый удаляем
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, content)
+
+
+@task
+def generate_variants(name, kind, force=False):
+    """
+    Создает варианты изображения. Изображения не увеличиваются: если оригинал уже
+    ширины варианта, вариант сохраняется в исходном размере.
+    Возвращает True, если варианты были созданы.
+    """
+    formats = variant_formats()
+    widths = VARIANT_WIDTHS[kind]
+    if not name:
+        return False
+    # Вариант наибольшей ширины создается последним, поэтому его наличие во всех
+    # форматах означает, что варианты готовы (после включения AVIF это уже не так)
+    if not force and all(default_storage.exists(variant_name(name, widths[-1], fmt)) for fmt in formats):
+        # Варианты созданы раньше (например, до учета форматов), отмечаем их готовыми
+        record_variants(name, formats)
+        return False
+
+    try:
+        with default_storage.open(name, 'rb') as source:
+            image = Image.open(source)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # Файл отсутствует или не является изображением
+        return False
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    for width in widths:
+        resized = image
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            buffer = BytesIO()
+            resized.save(buffer, format=fmt.upper(), quality=QUALITY[fmt])
+            save_as(variant_name(name, width, fmt), ContentFile(buffer.getvalue()))
+    record_variants(name, formats)
+    return True
+
+
+def delete_variants(name, kind):
+    """Удаляет все варианты изображения"""
+    if not name:
+        return
+    forget_variants(name)
+    for target in variant_names(name, kind):
+        if default_storage.exists(target):
+            default_storage.delete(target)
+
+
+def generate_instance_variants(instance, force=False):
+    """Создает варианты для всех изображений объекта (поля перечислены в image_variants модели)"""
+    for field_name, kind in instance.image_variants.items():
+        generate_variants(image_name(getattr(instance, field_name)), kind, force=force)
+
+
+def srcset(image, kind, fmt='webp'):
+    """Значение атрибута srcset для изображения"""
+    name = image_name(image)
+    return ', '.join(
+        f'{default_storage.url(variant_name(name, width, fmt))} {width}w'
+        for width in VARIANT_WIDTHS[kind]
+    )
+
+
+def admin_preview(image, kind, max_height):
+    """Превью изображения для админки: браузер выбирает вариант, близкий к высоте превью"""
+    name = image_name(image)
+    if not name:
+        return None
+    if 'webp' not in ready_formats(name):
+        return format_html('<img src="{}" style="max-height: {}px;"/>', default_storage.url(name), max_height)
+    return format_html(
+        '<img src="{}" srcset="{}" sizes="{}px" style="max-height: {}px;"/>',
+        default_storage.url(name), srcset(name, kind), max_height, max_height,
+    )
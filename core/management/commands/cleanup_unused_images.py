@@ -1,9 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from django.db.models import FileField
 from django.apps import apps
+import json
 import os
 import re
+import time
+
+from core.images import variant_names
+from core.models import StoredFile
+
+# Манифест последнего прохода (используется режимом --incremental)
+MANIFEST_FILE = '.cleanup_manifest.json'
+
+IMAGE_RE = re.compile(r'\.(jpg|jpeg|png|gif|webp|avif|svg)$', re.IGNORECASE)
+
+
+def scan_directory(path, newer_than=0):
+    """
+    Рекурсивно собирает изображения каталога через os.scandir.
+    Возвращает список (путь, размер, время изменения) для файлов новее newer_than.
+    """
+    found = []
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    # Игнорируем .gitignore, манифесты и другие служебные файлы
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and IMAGE_RE.search(entry.name):
+                        stat = entry.stat(follow_symlinks=False)
+                        if stat.st_mtime > newer_than:
+                            found.append((entry.path, stat.st_size, stat.st_mtime))
+        except FileNotFoundError:
+            # Каталог удален во время обхода
+            continue
+    return found
 
 
 class Command(BaseCommand):
@@ -15,69 +53,135 @@ class Command(BaseCommand):
             action='store_true',
             help='Только показывает, какие файлы будут удалены, без реального удаления',
         )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Проверять только файлы, измененные после предыдущего прохода',
+        )
+        parser.add_argument(
+            '--grace-period',
+            type=int,
+            default=3600,
+            help='Не трогать файлы моложе указанного числа секунд (защита загрузок, которые еще не сохранены в БД)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Количество потоков для обхода каталогов',
+        )
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
+        grace_period = options['grace_period']
+        media_root = str(settings.MEDIA_ROOT)
+        manifest_path = os.path.join(media_root, MANIFEST_FILE)
+        started_at = time.time()
         
-        # Получаем все поля с файлами из всех моделей
-        file_fields = []
-        for model in apps.get_models():
-            file_fields.extend([
-                (f.name, model)
-                for f in model._meta.fields
-                if isinstance(f, FileField)
-            ])
-        
-        # Получаем все используемые файлы
-        used_files = set()
-        for field_name, model in file_fields:
-            for instance in model.objects.all():
-                file_instance = getattr(instance, field_name)
-                if file_instance and file_instance.name:
-                    used_files.add(file_instance.path)
+        # В инкрементальном режиме проверяем только файлы новее предыдущего прохода
+        # (с запасом на период ожидания: такие файлы в прошлый раз были пропущены)
+        newer_than = 0
+        if options['incremental'] and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                newer_than = json.load(f).get('scanned_at', 0) - grace_period
         
-        # Получаем все файлы в медиа директории
-        media_root = settings.MEDIA_ROOT
-        all_files = []
-        for root, dirs, files in os.walk(media_root):
-            for file in files:
-                # Игнорируем .gitignore и другие служебные файлы
-                if not file.startswith('.'):
-                    all_files.append(os.path.join(root, file))
+        used_files = self.collect_used_files()
+        image_files = self.scan(media_root, newer_than, options['workers'])
         
-        # Фильтруем только изображения (с расширениями jpg, jpeg, png, gif, webp, svg)
-        image_files = [
-            file for file in all_files 
-            if re.search(r'\.(jpg|jpeg|png|gif|webp|svg)$', file.lower())
-        ]
-        
-        # Находим неиспользуемые изображения
-        unused_images = [
-            file for file in image_files
-            if file not in used_files
-        ]
+        # Файлы моложе периода ожидания могут принадлежать загрузкам, которые еще не сохранены в БД
+        deadline = started_at - grace_period
+        unused_images = []
+        skipped = 0
+        for path, size, mtime in image_files:
+            name = os.path.relpath(path, media_root)
+            if name in used_files:
+                continue
+            if mtime > deadline:
+                skipped += 1
+                continue
+            unused_images.append((path, size))
         
         # Выводим информацию
-        self.stdout.write(f"Найдено изображений: {len(image_files)}")
-        self.stdout.write(f"Используется изображений: {len(used_files)}")
+        self.stdout.write(f"Проверено изображений: {len(image_files)}")
+        self.stdout.write(f"Используется файлов (включая варианты): {len(used_files)}")
+        self.stdout.write(f"Пропущено новых файлов: {skipped}")
         self.stdout.write(f"Неиспользуемых изображений: {len(unused_images)}")
         
-        # Если есть неиспользуемые изображения
+        reclaimed = 0
         if unused_images:
             if dry_run:
                 self.stdout.write(self.style.WARNING("Dry-run режим. Следующие файлы будут удалены:"))
-                for file in unused_images:
-                    self.stdout.write(f" - {os.path.relpath(file, media_root)}")
+                for path, size in unused_images:
+                    self.stdout.write(f" - {os.path.relpath(path, media_root)} ({size} байт)")
+                    reclaimed += size
+                self.stdout.write(f"Будет освобождено: {reclaimed} байт")
             else:
                 count = 0
-                for file in unused_images:
+                for path, size in unused_images:
                     try:
-                        os.remove(file)
+                        os.remove(path)
                         count += 1
-                        self.stdout.write(f" - Удален файл: {os.path.relpath(file, media_root)}")
+                        reclaimed += size
+                        self.stdout.write(f" - Удален файл: {os.path.relpath(path, media_root)}")
                     except OSError as e:
-                        self.stdout.write(self.style.ERROR(f" - Ошибка при удалении {os.path.relpath(file, media_root)}: {e}"))
+                        self.stdout.write(self.style.ERROR(f" - Ошибка при удалении {os.path.relpath(path, media_root)}: {e}"))
                 
-                self.stdout.write(self.style.SUCCESS(f"Успешно удалено {count} неиспользуемых изображений"))
+                self.stdout.write(self.style.SUCCESS(
+                    f"Успешно удалено {count} неиспользуемых изображений, освобождено {reclaimed} байт"
+                ))
         else:
-            self.stdout.write(self.style.SUCCESS("Неиспользуемых изображений не найдено")) 
\ No newline at end of file
+            self.stdout.write(self.style.SUCCESS("Неиспользуемых изображений не найдено"))
+        
+        # Запоминаем время прохода для следующего инкрементального запуска
+        if not dry_run:
+            with open(manifest_path, 'w') as f:
+                json.dump({
+                    'scanned_at': started_at,
+                    'checked': len(image_files),
+                    'deleted': len(unused_images),
+                    'reclaimed_bytes': reclaimed,
+                }, f)
+
+    def collect_used_files(self):
+        """Имена используемых файлов и их адаптивных вариантов (без загрузки объектов)"""
+        used_files = set()
+        for model in apps.get_models():
+            for field in model._meta.fields:
+                if not isinstance(field, FileField):
+                    continue
+                kind = getattr(model, 'image_variants', {}).get(field.name)
+                names = model.objects.exclude(**{field.name: ''}).values_list(field.name, flat=True)
+                for name in names.iterator(chunk_size=2000):
+                    if not name:
+                        continue
+                    used_files.add(os.path.normpath(name))
+                    if kind:
+                        used_files.update(os.path.normpath(variant) for variant in variant_names(name, kind))
+        
+        # Файлы с учтенными ссылками тоже считаются используемыми
+        names = StoredFile.objects.filter(references__gt=0).values_list('name', flat=True)
+        used_files.update(os.path.normpath(name) for name in names.iterator(chunk_size=2000))
+        return used_files
+
+    def scan(self, media_root, newer_than, workers):
+        """Обходит каталоги верхнего уровня параллельно"""
+        if not os.path.isdir(media_root):
+            return []
+        
+        directories = []
+        image_files = []
+        with os.scandir(media_root) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False) and IMAGE_RE.search(entry.name):
+                    stat = entry.stat(follow_symlinks=False)
+                    if stat.st_mtime > newer_than:
+                        image_files.append((entry.path, stat.st_size, stat.st_mtime))
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for found in executor.map(lambda path: scan_directory(path, newer_than), directories):
+                image_files.extend(found)
+        return image_files
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.apps import apps
+
+from core.images import generate_instance_variants
+
+
+class Command(BaseCommand):
+    help = 'Создает адаптивные варианты (WebP/AVIF) для уже загруженных изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать варианты, даже если они уже существуют',
+        )
+
+    def handle(self, *args, **options):
+        force = options['force']
+        
+        # Модели, для изображений которых создаются варианты
+        models = [model for model in apps.get_models() if hasattr(model, 'image_variants')]
+        
+        count = 0
+        for model in models:
+            fields = list(model.image_variants)
+            for instance in model.objects.only('pk', *fields).iterator():
+                generate_instance_variants(instance, force=force)
+                count += 1
+            self.stdout.write(f"{model._meta.verbose_name_plural}: обработано")
+        
+        self.stdout.write(self.style.SUCCESS(f"Обработано объектов: {count}"))
@@ -0,0 +1,226 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import FileField
+from django.utils import timezone
+from django.apps import apps
+from PIL import Image, ImageOps
+from io import BytesIO
+import hashlib
+import json
+import os
+import re
+
+from core.images import generate_variants
+from core.models import StoredFile
+from core.storage import DIGEST_LENGTH
+
+# Файл с прогрессом обработки, позволяет продолжить прерванный запуск
+PROGRESS_FILE = '.optimize_media.json'
+
+# Через сколько обработанных файлов сохраняется прогресс
+PROGRESS_BATCH = 50
+
+# Форматы, которые пересжимаются, и параметры их сохранения
+FORMATS = {
+    'JPEG': {'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'method': 6},
+}
+
+# Адаптивные варианты изображений создаются отдельно (см. core.images)
+VARIANT_RE = re.compile(r'\.\d+w\.(webp|avif)$')
+
+
+def optimize_file(media_root, name, kind, max_size, quality):
+    """
+    Пересжимает изображение в новый файл рядом с оригиналом: удаляет EXIF,
+    ограничивает размеры и сохраняет с оптимизацией. Оригинал не изменяется.
+    Выполняется в отдельном процессе, поэтому обращается к БД только
+    для отметки созданных вариантов.
+    Возвращает (имя, новое имя или None, размер до, размер после, ошибка).
+    """
+    path = os.path.join(media_root, name)
+    try:
+        before = os.path.getsize(path)
+        with Image.open(path) as source:
+            image_format = source.format
+            if image_format not in FORMATS:
+                return name, None, before, before, None
+            has_exif = bool(source.info.get('exif')) or bool(source.getexif())
+            icc_profile = source.info.get('icc_profile')
+            image = ImageOps.exif_transpose(source)
+            image.load()
+        
+        resized = max(image.size) > max_size
+        if resized:
+            image.thumbnail((max_size, max_size), Image.LANCZOS)
+        
+        options = dict(FORMATS[image_format])
+        if image_format in ('JPEG', 'WEBP'):
+            options['quality'] = quality
+        if icc_profile:
+            options['icc_profile'] = icc_profile
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        
+        buffer = BytesIO()
+        image.save(buffer, format=image_format, **options)
+        data = buffer.getvalue()
+        after = len(data)
+        
+        # Оставляем оригинал, если пересжатие ничего не дало
+        if after >= before and not resized and not has_exif:
+            return name, None, before, before, None
+        
+        # Новый файл именуется по содержимому, как и при загрузке (см. core.storage)
+        digest = hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+        new_name = os.path.join(os.path.dirname(name), f"{digest}{os.path.splitext(name)[1].lower()}")
+        new_path = os.path.join(media_root, new_name)
+        if new_name == name:
+            return name, None, before, before, None
+        if not os.path.exists(new_path):
+            with open(new_path, 'wb') as f:
+                f.write(data)
+        
+        if kind:
+            generate_variants(new_name, kind, force=True)
+        return name, new_name, before, after, None
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        return name, None, 0, 0, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Пересжимает загруженные изображения: удаляет EXIF, ограничивает размеры и оптимизирует файлы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Количество процессов для обработки (по умолчанию - число ядер)',
+        )
+        parser.add_argument(
+            '--max-size',
+            type=int,
+            default=2560,
+            help='Максимальный размер большей стороны изображения в пикселях',
+        )
+        parser.add_argument(
+            '--quality',
+            type=int,
+            default=90,
+            help='Качество JPEG и WebP (PNG сжимается без потерь)',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать обработку заново, не учитывая сохраненный прогресс',
+        )
+
+    def handle(self, *args, **options):
+        media_root = str(settings.MEDIA_ROOT)
+        progress_path = os.path.join(media_root, PROGRESS_FILE)
+        
+        # Загружаем прогресс предыдущего запуска
+        done = {}
+        if not options['restart'] and os.path.exists(progress_path):
+            with open(progress_path) as f:
+                done = json.load(f)
+        
+        # Собираем используемые файлы: имя -> список (модель, поле)
+        references = self.collect_references()
+        
+        # Обрабатываем только файлы, на которые ссылаются записи, кроме уже обработанных
+        names = []
+        for root, dirs, files in os.walk(media_root):
+            for file in files:
+                name = os.path.relpath(os.path.join(root, file), media_root)
+                if file.startswith('.') or VARIANT_RE.search(file):
+                    continue
+                if name in references and name not in done:
+                    names.append(name)
+        
+        self.stdout.write(f"Изображений к обработке: {len(names)} (уже обработано: {len(done)})")
+        
+        # Соединения с БД не должны наследоваться процессами пула
+        connections.close_all()
+        
+        total_before = total_after = processed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [
+                executor.submit(
+                    optimize_file, media_root, name, self.get_kind(references[name]),
+                    options['max_size'], options['quality'],
+                )
+                for name in names
+            ]
+            for future in as_completed(futures):
+                name, new_name, before, after, error = future.result()
+                if error:
+                    self.stdout.write(self.style.ERROR(f" - Ошибка при обработке {name}: {error}"))
+                    continue
+                
+                if new_name:
+                    self.replace_file(references[name], name, new_name)
+                    self.stdout.write(f" - {name} -> {new_name}: {before} -> {after} байт")
+                    done[new_name] = None
+                done[name] = new_name
+                total_before += before
+                total_after += after
+                processed += 1
+                
+                # Прогресс сохраняется пачками: при прерывании повторно обработается не больше пачки
+                if processed % PROGRESS_BATCH == 0:
+                    self.save_progress(progress_path, done)
+        self.save_progress(progress_path, done)
+        
+        saved = total_before - total_after
+        self.stdout.write(self.style.SUCCESS(
+            f"Обработано файлов: {len(names)}. Размер до: {total_before} байт, после: {total_after} байт, "
+            f"освобождено: {saved} байт"
+        ))
+
+    def save_progress(self, progress_path, done):
+        with open(progress_path, 'w') as f:
+            json.dump(done, f)
+
+    def collect_references(self):
+        """Возвращает словарь {имя файла: [(модель, поле), ...]}"""
+        references = {}
+        for model in apps.get_models():
+            for field in model._meta.fields:
+                if not isinstance(field, FileField):
+                    continue
+                for name in model.objects.exclude(**{field.name: ''}).values_list(field.name, flat=True).iterator():
+                    if name:
+                        references.setdefault(name, []).append((model, field.name))
+        return references
+
+    def get_kind(self, refs):
+        """Вид адаптивных вариантов изображения (по первой ссылающейся записи)"""
+        for model, field_name in refs:
+            kind = getattr(model, 'image_variants', {}).get(field_name)
+            if kind:
+                return kind
+        return None
+
+    def replace_file(self, refs, name, new_name):
+        """
+        Атомарно переключает записи и ссылки (core.StoredFile) на новый файл
+        и обновляет updated_at записей, чтобы сбросить закэшированную разметку.
+        Старый файл и его варианты удаляются только после фиксации транзакции.
+        """
+        kind = self.get_kind(refs)
+        now = timezone.now()
+        with transaction.atomic():
+            updated = 0
+            for model, field_name in set(refs):
+                changes = {field_name: new_name}
+                # Кэш карточек привязан к updated_at, update() сам его не меняет
+                if any(field.name == 'updated_at' for field in model._meta.fields):
+                    changes['updated_at'] = now
+                updated += model.objects.filter(**{field_name: name}).update(**changes)
+            StoredFile.acquire(new_name, count=updated)
+            StoredFile.release(name, kind, count=updated)
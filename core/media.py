@@ -0,0 +1,125 @@
+"""
+Отдача медиафайлов через Django.
+
+В режиме x-accel Django только проверяет запрос, а передачу файла выполняет nginx
+по заголовку X-Accel-Redirect, поэтому воркер gunicorn не занят на время скачивания.
+Без nginx файл отдается напрямую с поддержкой ETag/If-None-Match и Range
+через FileResponse (sendfile, если сервер его поддерживает).
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+# Медиафайлы не меняются под тем же именем (см. core/storage.py)
+MEDIA_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _resolve(path):
+    """Возвращает абсолютный путь к файлу или вызывает Http404"""
+    # Служебные файлы (манифесты команд, .gitignore) не отдаются
+    if any(part.startswith('.') for part in path.split('/')):
+        raise Http404
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    return full_path
+
+
+def _etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def _parse_range(header, size):
+    """Разбирает заголовок Range с одним диапазоном; возвращает (start, end), None или False при ошибке"""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        # Последние N байт
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    """Отдает медиафайл в зависимости от настройки MEDIA_SERVE_MODE"""
+    full_path = _resolve(path)
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    if settings.MEDIA_SERVE_MODE == 'x-accel':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+        return response
+
+    stat = os.stat(full_path)
+    etag = _etag(stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': MEDIA_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]):
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (not if_range or if_range.strip() == etag):
+        byte_range = _parse_range(range_header, stat.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(_read_range(full_path, start, length), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = str(length)
+            for header, value in headers.items():
+                response[header] = value
+            return response
+
+    response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    for header, value in headers.items():
+        response[header] = value
+    return response
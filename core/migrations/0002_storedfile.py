@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:11
+
+from django.db import migrations, models
+
+
+# Поля с изображениями, на которые заводятся ссылки
+IMAGE_FIELDS = [
+    ('events', 'Event', ('poster', 'cover')),
+    ('tours', 'Tour', ('poster', 'cover')),
+    ('banners', 'Banner', ('cover',)),
+]
+
+
+def fill_stored_files(apps, schema_editor):
+    """Заводит учет ссылок на уже загруженные изображения"""
+    StoredFile = apps.get_model('core', 'StoredFile')
+    
+    references = {}
+    for app_label, model_name, fields in IMAGE_FIELDS:
+        model = apps.get_model(app_label, model_name)
+        for field in fields:
+            for name in model.objects.values_list(field, flat=True).iterator():
+                if name:
+                    references[name] = references.get(name, 0) + 1
+    
+    StoredFile.objects.bulk_create(
+        [StoredFile(name=name, references=count) for name, count in references.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('events', '0003_event_status_date_time_idx'),
+        ('tours', '0002_tour_active_created_idx'),
+        ('banners', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Имя файла')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Количество ссылок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Файл хранилища',
+                'verbose_name_plural': 'Файлы хранилища',
+            },
+        ),
+        migrations.RunPython(fill_stored_files, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:35
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+from core.images import ALL_FORMATS, VARIANT_WIDTHS, variant_name
+
+
+# Поля с изображениями и виды их вариантов
+IMAGE_FIELDS = [
+    ('events', 'Event', (('poster', 'card'), ('cover', 'cover'))),
+    ('tours', 'Tour', (('poster', 'card'), ('cover', 'cover'))),
+    ('banners', 'Banner', (('cover', 'cover'),)),
+]
+
+
+def fill_variants(apps, schema_editor):
+    """Отмечает форматы вариантов, созданных до появления учета"""
+    StoredFile = apps.get_model('core', 'StoredFile')
+
+    kinds = {}
+    for app_label, model_name, fields in IMAGE_FIELDS:
+        model = apps.get_model(app_label, model_name)
+        for field, kind in fields:
+            for name in model.objects.values_list(field, flat=True).iterator():
+                if name:
+                    kinds[name] = kind
+
+    stored_files = []
+    for stored in StoredFile.objects.filter(name__in=list(kinds)).iterator():
+        widths = VARIANT_WIDTHS[kinds[stored.name]]
+        stored.variants = ','.join(
+            fmt for fmt in ALL_FORMATS
+            if default_storage.exists(variant_name(stored.name, widths[-1], fmt))
+        )
+        if stored.variants:
+            stored_files.append(stored)
+    StoredFile.objects.bulk_update(stored_files, ['variants'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_storedfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedfile',
+            name='variants',
+            field=models.CharField(blank=True, default='', help_text='Форматы, в которых созданы адаптивные варианты изображения, через запятую', max_length=50, verbose_name='Форматы вариантов'),
+        ),
+        migrations.RunPython(fill_variants, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,15 @@
 from django.db import models
 import json
-from django.db.models.signals import pre_save, post_delete
+from collections import Counter
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from .caching import bump_version, get_version
+from .images import delete_variants, generate_variants
+from jobs.queue import enqueue, task
 import os
 
 class JSONList(models.Field):
@@ -35,6 +43,12 @@ class JSONList(models.Field):
         value = self.value_from_object(obj)
         return self.get_prep_value(value)
 
+# Копия информации о сайте в памяти процесса: (версия, объект)
+_site_info_local = {}
+
+# Время жизни информации о сайте в общем кэше (секунды); записи прежних версий вытесняются по его истечении
+SITE_INFO_CACHE_TIMEOUT = 86400
+
 class SiteInfo(models.Model):
     """Модель информации о сайте"""
     # Логотип удален, так как должен обновляться вручную администратором сервера
@@ -58,6 +72,31 @@ class SiteInfo(models.Model):
     def __str__(self):
         return self.company_name
     
+    @classmethod
+    def load(cls):
+        """
+        Возвращает единственную запись информации о сайте.
+        Запись хранится в памяти процесса и в общем кэше, пока не изменится версия 'site'.
+        """
+        version = get_version('site')
+        if _site_info_local.get('version') == version:
+            return _site_info_local['object']
+        
+        key = f'site_info:{version}'
+        site_info = cache.get(key)
+        if site_info is None:
+            site_info = cls.objects.order_by('pk').first()
+            if site_info is None:
+                # get_or_create по фиксированному pk не создаст дубликат при одновременных запросах
+                site_info, _ = cls.objects.get_or_create(pk=1)
+                # Создание записи увеличило версию, кэшируем под новой
+                version = get_version('site')
+                key = f'site_info:{version}'
+            cache.set(key, site_info, SITE_INFO_CACHE_TIMEOUT)
+        
+        _site_info_local.update(version=version, object=site_info)
+        return site_info
+    
     def get_company_details_list(self):
         """Преобразует текстовое поле company_details в список для шаблона"""
         if not self.company_details:
@@ -80,4 +119,181 @@ class SiteInfo(models.Model):
         verbose_name = "Информация о сайте"
         verbose_name_plural = "Информация о сайте"
 
+class StoredFile(models.Model):
+    """
+    Учет ссылок на файл в медиахранилище.
+    Один файл может использоваться несколькими записями (например, копиями мероприятия),
+    и удаляется только тогда, когда ссылок на него не осталось.
+    """
+    name = models.CharField(max_length=255, unique=True, verbose_name="Имя файла")
+    references = models.PositiveIntegerField(default=0, verbose_name="Количество ссылок")
+    variants = models.CharField(
+        max_length=50,
+        blank=True,
+        default='',
+        verbose_name="Форматы вариантов",
+        help_text="Форматы, в которых созданы адаптивные варианты изображения, через запятую",
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    
+    class Meta:
+        verbose_name = "Файл хранилища"
+        verbose_name_plural = "Файлы хранилища"
+    
+    def __str__(self):
+        return f"{self.name} ({self.references})"
+    
+    @classmethod
+    def acquire(cls, name, count=1):
+        """Добавляет ссылки на файл. Возвращает True, если до этого ссылок на файл не было"""
+        if not name or count <= 0:
+            return False
+        # Строка блокируется, как и в release(): иначе release() может удалить ее
+        # между чтением и увеличением счетчика, и файл удалится, хотя на него ссылаются
+        with transaction.atomic():
+            stored = cls.objects.select_for_update().filter(name=name).first()
+            if stored is None:
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(name=name, references=count)
+                    return True
+                except IntegrityError:
+                    # Строку успел создать параллельный запрос
+                    stored = cls.objects.select_for_update().get(name=name)
+            cls.objects.filter(pk=stored.pk).update(references=F('references') + count)
+            return stored.references == 0
+    
+    @classmethod
+    def release(cls, name, kind=None, count=1):
+        """
+        Убирает ссылки на файл. Когда ссылок не остается, файл и его варианты
+        удаляются после фиксации транзакции.
+        Строка с нулем ссылок остается до выполнения задачи удаления: задача
+        блокирует ее, чтобы повторная загрузка того же файла не потеряла его.
+        """
+        if not name or count <= 0:
+            return
+        with transaction.atomic():
+            stored = cls.objects.select_for_update().filter(name=name).first()
+            if stored is None:
+                # Файл загружен до появления учета ссылок
+                stored, created = cls.objects.get_or_create(name=name)
+                if not created:
+                    # Строку успел создать параллельный запрос, взявший ссылку
+                    return
+            elif stored.references > count:
+                cls.objects.filter(pk=stored.pk).update(references=F('references') - count)
+                return
+            else:
+                cls.objects.filter(pk=stored.pk).update(references=0)
+        # Задача удаления фиксируется вместе с транзакцией: при откате изображение сохранится
+        enqueue(delete_stored_file, name, kind)
+
+@task
+def delete_stored_file(name, kind=None):
+    """
+    Удаляет файл из хранилища вместе с его адаптивными вариантами и строкой учета ссылок.
+    Строка заблокирована до конца удаления: HashedMediaStorage.save() того же файла
+    ждет блокировку и затем записывает файл заново.
+    """
+    with transaction.atomic():
+        stored = StoredFile.objects.select_for_update().filter(name=name).first()
+        # Пока задача ждала в очереди, такой же файл могли загрузить снова
+        if stored is None or stored.references > 0:
+            return
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        if kind:
+            delete_variants(name, kind)
+        stored.delete()
+
+class ImageFilesMixin:
+    """
+    Примесь для моделей с изображениями, перечисленными в image_variants.
+    Запоминает имена файлов при загрузке объекта из БД, чтобы при сохранении
+    определить замененные изображения без дополнительного запроса.
+    """
+    image_variants = {}
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._old_file_names = {
+            field_name: getattr(instance, field_name).name
+            for field_name in cls.image_variants
+            if field_name in instance.__dict__
+        }
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # Файлы записываются в хранилище до сохранения строки, а ссылки на них берутся
+        # в post_save: общая транзакция удерживает блокировку StoredFile между этими шагами
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+def remember_file_names(instance):
+    """
+    Дозапрашивает имена изображений, которые не были загружены вместе с объектом
+    (вызывается в pre_save). Обычно все имена уже известны, и запрос не выполняется.
+    """
+    if instance._state.adding:
+        return
+    old_names = getattr(instance, '_old_file_names', None)
+    if old_names is None:
+        old_names = instance._old_file_names = {}
+    deferred = instance.get_deferred_fields()
+    missing = [
+        field_name for field_name in instance.image_variants
+        if field_name not in old_names and field_name not in deferred
+    ]
+    if missing:
+        old_names.update(type(instance).objects.filter(pk=instance.pk).values(*missing).first() or {})
+
+def update_file_references(instance, created=False):
+    """
+    Переносит ссылки со старых изображений объекта на новые и ставит в очередь
+    создание вариантов новых изображений (вызывается в post_save)
+    """
+    # Копия объекта (pk = None) унаследовала имена оригинала, но ссылок на них еще не брала
+    old_names = {} if created else getattr(instance, '_old_file_names', {})
+    deferred = instance.get_deferred_fields()
+    for field_name, kind in instance.image_variants.items():
+        if field_name in deferred:
+            continue
+        new_name = getattr(instance, field_name).name or ''
+        old_name = old_names.get(field_name) or ''
+        if new_name != old_name:
+            # Варианты нужны только новому файлу: у уже используемого они есть
+            if StoredFile.acquire(new_name):
+                enqueue(generate_variants, new_name, kind)
+            StoredFile.release(old_name, kind)
+    instance._old_file_names = {
+        field_name: getattr(instance, field_name).name
+        for field_name in instance.image_variants
+        if field_name not in deferred
+    }
+
+def acquire_file_references(instances):
+    """Добавляет ссылки на изображения объектов, созданных без сигналов (bulk_create)"""
+    counts = Counter(
+        (getattr(instance, field_name).name, kind)
+        for instance in instances
+        for field_name, kind in instance.image_variants.items()
+        if getattr(instance, field_name).name
+    )
+    for (name, kind), count in counts.items():
+        if StoredFile.acquire(name, count):
+            enqueue(generate_variants, name, kind)
+
+def release_file_references(instance):
+    """Убирает ссылки на изображения удаленного объекта (вызывается в post_delete)"""
+    for field_name, kind in instance.image_variants.items():
+        StoredFile.release(getattr(instance, field_name).name, kind)
+
 # Удалены сигналы для обработки изображений, так как поля logo больше нет
+
+# Сигнал для инвалидации кэша при изменении информации о сайте
+@receiver([post_save, post_delete], sender=SiteInfo)
+def bump_site_version(sender, **kwargs):
+    """Обработчик сигнала, который сбрасывает кэши, зависящие от информации о сайте"""
+    bump_version('site')
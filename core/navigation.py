@@ -0,0 +1,44 @@
+"""
+Данные для навигационного меню, общие для всех страниц сайта.
+Вычисляются один раз для текущей версии данных и хранятся в кэше
+до момента, когда флаги могут измениться из-за ухода мероприятий в архив.
+"""
+from django.core.cache import cache
+
+from events.models import Event
+from tours.models import Tour
+from faq.models import Question
+from .caching import versioned_key, timeout_until
+
+# Максимальное время жизни записи (секунды)
+NAV_CACHE_TIMEOUT = 86400
+
+
+def get_navigation():
+    """Возвращает флаги наличия разделов для ссылок в меню и момент их устаревания"""
+    key = versioned_key('nav', 'events', 'tours', 'faq')
+    navigation = cache.get(key)
+    if navigation is None:
+        upcoming = Event.objects.upcoming()
+        has_events = upcoming.exists()
+        has_tours = Tour.objects.filter(is_active=True).with_upcoming_events().exists()
+
+        # Флаги меняются, когда в архив уходит последнее предстоящее мероприятие
+        # (для туров - последнее мероприятие активных туров)
+        boundaries = []
+        if has_events:
+            boundaries.append(upcoming.latest_archive_at())
+        if has_tours:
+            boundaries.append(upcoming.filter(tours__is_active=True).latest_archive_at())
+        boundaries = [moment for moment in boundaries if moment is not None]
+
+        navigation = {
+            'has_events': has_events,
+            'has_tours': has_tours,
+            'has_questions': Question.objects.exists(),
+            'expires_at': min(boundaries, default=None),
+        }
+        timeout = timeout_until(navigation['expires_at'], NAV_CACHE_TIMEOUT)
+        if timeout > 0:
+            cache.set(key, navigation, timeout)
+    return navigation
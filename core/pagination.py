@@ -0,0 +1,75 @@
+"""
+Постраничный вывод мероприятий по ключу (keyset pagination).
+
+Курсор кодирует (date, time, id) последней показанной записи, поэтому
+следующая страница выбирается условием по индексу, а не через OFFSET,
+и стоимость запроса не растет с размером архива.
+"""
+import base64
+import binascii
+from datetime import date, time
+
+from django.db.models import Q
+
+
+def get_int_param(request, name):
+    """Возвращает целочисленный GET-параметр или None"""
+    try:
+        return int(request.GET.get(name, ''))
+    except ValueError:
+        return None
+
+
+def encode_cursor(event):
+    """Кодирует позицию мероприятия (объекта или словаря карточки) в строку курсора"""
+    if isinstance(event, dict):
+        event_date, event_time, pk = event['date'], event['time'], event['pk']
+    else:
+        event_date, event_time, pk = event.date, event.time, event.pk
+    raw = f'{event_date.isoformat()}|{event_time.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """Декодирует курсор в кортеж (date, time, id) или возвращает None, если он некорректен"""
+    if not value:
+        return None
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        date_part, time_part, pk_part = raw.split('|')
+        return date.fromisoformat(date_part), time.fromisoformat(time_part), int(pk_part)
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(queryset, cursor, per_page, descending=False):
+    """
+    Возвращает (список мероприятий, курсор следующей страницы).
+    Курсор следующей страницы равен None, если страница последняя.
+    """
+    position = decode_cursor(cursor)
+    if position:
+        event_date, event_time, pk = position
+        if descending:
+            queryset = queryset.filter(
+                Q(date__lt=event_date)
+                | Q(date=event_date, time__lt=event_time)
+                | Q(date=event_date, time=event_time, id__lt=pk)
+            )
+        else:
+            queryset = queryset.filter(
+                Q(date__gt=event_date)
+                | Q(date=event_date, time__gt=event_time)
+                | Q(date=event_date, time=event_time, id__gt=pk)
+            )
+
+    ordering = ('-date', '-time', '-id') if descending else ('date', 'time', 'id')
+
+    # Запрашиваем на одну запись больше, чтобы узнать, есть ли следующая страница
+    items = list(queryset.order_by(*ordering)[:per_page + 1])
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor(items[-1])
+    return items, next_cursor
@@ -0,0 +1,22 @@
+"""
+Выражения для легких выборок карточек (values()).
+Адреса страниц и изображений собираются в БД, чтобы шаблонам
+не приходилось вызывать reverse() и обращаться к хранилищу для каждой строки.
+"""
+from django.conf import settings
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Concat
+from django.urls import reverse
+
+SLUG_PLACEHOLDER = '__slug__'
+
+
+def url_by_slug(url_name, field='slug'):
+    """Выражение с адресом страницы, принимающей slug"""
+    prefix, suffix = reverse(url_name, args=[SLUG_PLACEHOLDER]).split(SLUG_PLACEHOLDER)
+    return Concat(Value(prefix), F(field), Value(suffix), output_field=CharField())
+
+
+def media_url(field):
+    """Выражение с адресом загруженного файла"""
+    return Concat(Value(settings.MEDIA_URL), F(field), output_field=CharField())
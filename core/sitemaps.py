@@ -0,0 +1,90 @@
+"""
+Карты сайта для поисковых роботов.
+
+Разделы строятся из легких выборок values() с готовыми адресами страниц,
+lastmod берется из updated_at. Для индекса карт время последнего изменения
+раздела вычисляется одним агрегирующим запросом, а не перебором всех записей.
+Большие разделы разбиваются на страницы, которые перечисляются в индексе.
+"""
+from django.contrib.sitemaps import Sitemap
+from django.db.models import F, Max
+from django.db.models.functions import Greatest, Now
+from django.urls import reverse
+
+from events.models import Event
+from tours.models import Tour
+from .projections import url_by_slug
+
+# Количество адресов на одной странице раздела карты сайта
+SITEMAP_PAGE_SIZE = 5000
+
+
+class QuerySetSitemap(Sitemap):
+    """
+    Раздел по выборке, которую возвращает метод queryset() подкласса: адрес страницы
+    строится по имени маршрута url_name, lastmod - по выражению lastmod_expression
+    """
+    limit = SITEMAP_PAGE_SIZE
+    url_name = None
+    lastmod_expression = F('updated_at')
+
+    def items(self):
+        return self.queryset().values(url=url_by_slug(self.url_name), lastmod=self.lastmod_expression)
+
+    def location(self, item):
+        return item['url']
+
+    def lastmod(self, item):
+        return item['lastmod']
+
+    def get_latest_lastmod(self):
+        return self.queryset().order_by().aggregate(value=Max(self.lastmod_expression))['value']
+
+
+class UpcomingEventSitemap(QuerySetSitemap):
+    changefreq = 'daily'
+    priority = 0.8
+    url_name = 'event_detail'
+
+    def queryset(self):
+        # Граница архива вычисляется в БД в момент запроса
+        return Event.objects.upcoming(Now()).order_by('date', 'time', 'pk')
+
+
+class ArchivedEventSitemap(QuerySetSitemap):
+    changefreq = 'monthly'
+    priority = 0.3
+    url_name = 'event_detail'
+    # Страница мероприятия меняется и в момент ухода в архив
+    lastmod_expression = Greatest('updated_at', 'archive_at')
+
+    def queryset(self):
+        return Event.objects.past(Now()).order_by('-date', '-time', '-pk')
+
+
+class TourSitemap(QuerySetSitemap):
+    changefreq = 'weekly'
+    priority = 0.7
+    url_name = 'tour_detail'
+
+    def queryset(self):
+        return Tour.objects.filter(is_active=True).order_by('-created_at', '-pk')
+
+
+class StaticSitemap(Sitemap):
+    changefreq = 'weekly'
+    priority = 0.5
+
+    def items(self):
+        return ['index', 'archive', 'privacy_policy', 'terms_of_service']
+
+    def location(self, item):
+        return reverse(item)
+
+
+SITEMAPS = {
+    'events': UpcomingEventSitemap,
+    'archive': ArchivedEventSitemap,
+    'tours': TourSitemap,
+    'pages': StaticSitemap,
+}
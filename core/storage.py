@@ -0,0 +1,80 @@
+"""
+Хранилище медиафайлов с именами по содержимому.
+
+Загруженный файл сохраняется под именем из хэша содержимого в каталоге,
+который задает upload_to: events/cards/<sha256>.jpg. Одинаковые файлы
+(например, у копий мероприятий) занимают место на диске один раз, а содержимое
+файла с данным именем никогда не меняется, поэтому его можно кэшировать навсегда.
+Учет ссылок на файлы ведет модель core.StoredFile.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+# Длина хэша в имени файла (128 бит достаточно для исключения совпадений)
+DIGEST_LENGTH = 32
+
+
+def content_digest(content):
+    """Хэш содержимого файла; позиция чтения возвращается в начало"""
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()[:DIGEST_LENGTH]
+
+
+class HashedMediaStorage(FileSystemStorage):
+    """Файловое хранилище, именующее загружаемые файлы по хэшу содержимого"""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        directory = os.path.dirname(name)
+        ext = os.path.splitext(name)[1].lower()
+        name = os.path.join(directory, f'{content_digest(content)}{ext}')
+        
+        # Такой файл уже есть: повторно не записываем
+        if self.exists(name) and self._lock_existing(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def _lock_existing(self, name):
+        """
+        Блокирует строку учета ссылок на существующий файл до конца транзакции,
+        в которой на него будет взята ссылка, чтобы задача удаления не удалила
+        файл раньше. Возвращает False, если файл успели удалить.
+        """
+        from .models import StoredFile
+
+        with transaction.atomic():
+            StoredFile.objects.select_for_update().filter(name=name).first()
+        return self.exists(name)
+
+    def save_as(self, name, content):
+        """
+        Сохраняет производный файл (например, вариант изображения) точно под указанным именем.
+        Файл записывается во временный и подменяется атомарно, поэтому параллельные
+        задачи не мешают друг другу, а читатели не видят недописанный файл.
+        """
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
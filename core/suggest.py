@@ -0,0 +1,132 @@
+"""
+Подсказки при вводе поискового запроса.
+
+Каждый процесс держит в памяти отсортированный список ключей: нормализованные
+названия мероприятий, площадок, городов и туров, начиная с каждого слова
+("рок концерт в саратове", "концерт в саратове", ...). Подсказки по началу
+строки находятся двоичным поиском, без обращения к БД. Индекс перестраивается,
+когда меняются версии данных или когда в архив уходит мероприятие из индекса.
+"""
+import re
+import threading
+from bisect import bisect_left
+from urllib.parse import urlencode
+
+from django.db.models import Exists, OuterRef
+from django.urls import reverse
+from django.utils import timezone
+
+from events.models import City, Event
+from tours.models import Tour
+from .caching import get_versions
+
+# Сколько совпадений ключей просматривается для выбора лучших подсказок
+SCAN_LIMIT = 200
+
+WORD_RE = re.compile(r'\w+')
+
+_index_lock = threading.Lock()
+# Индекс процесса: {'versions': ..., 'expires_at': ..., 'index': SuggestIndex}
+_index_local = {}
+
+
+def normalize(text):
+    """Приводит текст к виду ключа: слова в нижнем регистре через пробел, ё заменена на е"""
+    return ' '.join(WORD_RE.findall(text.casefold().replace('ё', 'е')))
+
+
+class SuggestIndex:
+    """Отсортированный массив ключей (ключ, номер подсказки) с поиском по началу строки"""
+
+    def __init__(self):
+        self.entries = []
+        self.keys = []
+
+    def add(self, entry, *texts):
+        """Добавляет подсказку, находимую по началу любого слова перечисленных текстов"""
+        number = len(self.entries)
+        self.entries.append(entry)
+        for text in texts:
+            words = normalize(text or '').split(' ')
+            for position in range(len(words)):
+                key = ' '.join(words[position:])
+                if key:
+                    self.keys.append((key, number))
+
+    def finish(self):
+        self.keys.sort()
+        return self
+
+    def lookup(self, query, limit):
+        """
+        Возвращает до limit подсказок, у которых ключ начинается с запроса.
+        Подсказки идут в порядке добавления: города, туры, мероприятия по дате.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        found = set()
+        position = bisect_left(self.keys, (prefix,))
+        for key, number in self.keys[position:position + SCAN_LIMIT]:
+            if not key.startswith(prefix):
+                break
+            found.add(number)
+        return [self.entries[number] for number in sorted(found)[:limit]]
+
+
+def build_index():
+    """Строит индекс по предстоящим мероприятиям, их городам и активным турам"""
+    index = SuggestIndex()
+    upcoming = Event.objects.upcoming()
+
+    cities = City.objects.filter(Exists(upcoming.filter(city=OuterRef('pk')))).order_by('name')
+    for city in cities.values('name'):
+        url = f"{reverse('search')}?{urlencode({'q': city['name']})}"
+        index.add({'kind': 'city', 'label': city['name'], 'url': url}, city['name'])
+
+    tours = Tour.objects.filter(is_active=True).with_upcoming_events().order_by('-created_at')
+    for tour in tours.cards():
+        index.add({'kind': 'tour', 'label': tour['title'], 'url': tour['url']}, tour['title'])
+
+    expires_at = None
+    for event in upcoming.cards():
+        details = f"{event['city_name']}, {event['date']:%d.%m.%Y}"
+        index.add(
+            {'kind': 'event', 'label': event['title'], 'details': details, 'url': event['url']},
+            event['title'], event['venue'],
+        )
+        if event['archive_at'] and (expires_at is None or event['archive_at'] < expires_at):
+            expires_at = event['archive_at']
+
+    return index.finish(), expires_at
+
+
+def _fresh_index(versions):
+    current = _index_local.get('current')
+    if current is None or current['versions'] != versions:
+        return None
+    if current['expires_at'] is not None and current['expires_at'] <= timezone.now():
+        return None
+    return current['index']
+
+
+def get_index():
+    """Возвращает индекс процесса, перестраивая его при изменении данных"""
+    versions = get_versions('events', 'tours')
+    index = _fresh_index(versions)
+    if index is not None:
+        return index
+
+    # Перестраивает индекс один поток, остальные ждут готовый
+    with _index_lock:
+        index = _fresh_index(versions)
+        if index is not None:
+            return index
+        index, expires_at = build_index()
+        _index_local['current'] = {'versions': versions, 'expires_at': expires_at, 'index': index}
+        return index
+
+
+def suggest(query, limit=8):
+    """Подсказки для начала поискового запроса"""
+    return get_index().lookup(query, limit)
@@ -0,0 +1,93 @@
+"""
+Кэширование фрагментов шаблонов с ключами по версиям данных.
+
+Использование:
+    {% load fragment_cache %}
+    {% fragment_cache 'footer' 'site' by current_year %} ... {% endfragment_cache %}
+
+После имени фрагмента перечисляются группы данных (см. core.caching), при изменении
+которых фрагмент сбрасывается, после слова by - значения, от которых зависит содержимое.
+Для объектов моделей в ключ попадают pk и updated_at, поэтому изменение мероприятия
+сбрасывает только фрагменты, в которые оно входит. Готовность адаптивных вариантов
+изображений не меняет updated_at, поэтому фрагменты с изображениями перечисляют
+группу images, которая увеличивается при создании вариантов (см. core.images).
+"""
+import hashlib
+
+from django import template
+from django.core.cache import cache
+from django.db import models
+
+from core.caching import versioned_key
+
+register = template.Library()
+
+# Время жизни фрагментов (секунды); устаревшие версии вытесняются из кэша по его истечении
+FRAGMENT_CACHE_TIMEOUT = 86400
+
+
+def _vary_value(value):
+    """Преобразует значение в строку для ключа кэша"""
+    if isinstance(value, models.Model):
+        updated_at = getattr(value, 'updated_at', None)
+        stamp = updated_at.timestamp() if updated_at else ''
+        return f'{value._meta.label_lower}:{value.pk}@{stamp}'
+    if isinstance(value, dict) and 'pk' in value:
+        updated_at = value.get('updated_at')
+        stamp = updated_at.timestamp() if updated_at else ''
+        return f'{value["pk"]}@{stamp}'
+    if isinstance(value, (list, tuple, models.QuerySet)):
+        return '[' + ','.join(_vary_value(item) for item in value) + ']'
+    return str(value)
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, name, groups, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.groups = groups
+        self.vary_on = vary_on
+
+    def render(self, context):
+        vary = '|'.join(_vary_value(expression.resolve(context)) for expression in self.vary_on)
+        digest = hashlib.md5(vary.encode()).hexdigest()
+
+        prefix = f'fragment:{self.name}'
+        if self.groups:
+            prefix = versioned_key(prefix, *self.groups)
+        key = f'{prefix}:{digest}'
+
+        content = cache.get(key)
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, FRAGMENT_CACHE_TIMEOUT)
+        return content
+
+
+def _literal(token, bit):
+    if len(bit) < 2 or bit[0] != bit[-1] or bit[0] not in ('"', "'"):
+        raise template.TemplateSyntaxError(
+            f"'{token.contents.split()[0]}': имя фрагмента и группы должны быть строками в кавычках"
+        )
+    return bit[1:-1]
+
+
+@register.tag('fragment_cache')
+def do_fragment_cache(parser, token):
+    """{% fragment_cache 'имя' ['группа' ...] [by значение ...] %} ... {% endfragment_cache %}"""
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' требует имя фрагмента")
+
+    vary_on = []
+    if 'by' in bits:
+        position = bits.index('by')
+        vary_on = [parser.compile_filter(bit) for bit in bits[position + 1:]]
+        bits = bits[:position]
+
+    name = _literal(token, bits[1])
+    groups = tuple(_literal(token, bit) for bit in bits[2:])
+
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+    return FragmentCacheNode(nodelist, name, groups, vary_on)
@@ -0,0 +1,56 @@
+"""
+Вывод адаптивных изображений.
+
+Использование:
+    {% load images %}
+    {% picture event.poster 'card' alt=event.title class='event-card-image' loading='lazy' %}
+
+Перед выводом списка карточек форматы вариантов загружаются для всего списка сразу:
+    {% prime_images events 'poster' %}
+"""
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from core.images import VARIANT_SIZES, srcset, variant_formats, image_name, ready_formats, ready_formats_many
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(image, kind, alt='', loading=None, **attrs):
+    """
+    Элемент <picture> с вариантами изображения в современных форматах
+    и оригиналом в <img> для браузеров без их поддержки. Источники выводятся
+    только для форматов, варианты в которых уже созданы.
+    Принимает FieldFile или имя файла (например, из выборки cards()).
+    """
+    name = image_name(image)
+    if not name:
+        return ''
+
+    sizes = VARIANT_SIZES[kind]
+    ready = ready_formats(name)
+    sources = format_html_join(
+        '', '<source type="image/{}" srcset="{}" sizes="{}" />',
+        ((fmt, srcset(name, kind, fmt), sizes) for fmt in variant_formats() if fmt in ready),
+    )
+    extra = format_html_join('', ' {}="{}"', attrs.items())
+    if loading:
+        extra = format_html('{} loading="{}"', extra, loading)
+    return format_html(
+        '<picture style="display: contents">{}<img src="{}" alt="{}"{} /></picture>',
+        sources, default_storage.url(name), alt, extra,
+    )
+
+
+@register.simple_tag
+def prime_images(items, *fields):
+    """Загружает форматы вариантов изображений списка одним обращением к кэшу и к БД"""
+    names = []
+    for item in items:
+        for field in fields:
+            value = item[field] if isinstance(item, dict) else getattr(item, field)
+            names.append(image_name(value))
+    ready_formats_many(names)
+    return ''
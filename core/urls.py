@@ -4,6 +4,10 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('archive/', views.archive, name='archive'),
+    path('search/', views.search, name='search'),
+    path('search/suggest/', views.suggest, name='suggest'),
+    path('sitemap.xml', views.sitemap_index, name='sitemap'),
+    path('sitemap-<str:section>.xml', views.sitemap_section, name='sitemap_section'),
     path('privacy/', views.privacy_policy, name='privacy_policy'),
     path('terms/', views.terms_of_service, name='terms_of_service'),
 ] 
\ No newline at end of file
@@ -1,6 +1,7 @@
 from django.shortcuts import render
-from events.models import Event, City, EventType, AgeRestriction, EventStatus
-from tours.models import Tour
+from django.http import JsonResponse
+from events.models import Event, City, EventType
+from tours.models import Tour, attach_city_names
 from banners.models import Banner
 from faq.models import Question
 from django.utils import timezone
@@ -8,7 +9,15 @@ from django.db.models import Q
 import datetime
 import pytz
 from django.conf import settings
+from django.db.models import Exists, OuterRef
+from events.views import get_upcoming_page
+from .pagination import keyset_page, get_int_param
+from .caching import cache_public_page, expire_at
+from .suggest import suggest as get_suggestions
+from .sitemaps import SITEMAPS
+from django.contrib.sitemaps import views as sitemap_views
 
+@cache_public_page
 def index(request):
     """Главная страница сайта"""
     # Получаем активные баннеры
@@ -18,37 +27,22 @@ def index(request):
     now = timezone.now()
     today = now.date()
     
-    # Получаем все ближайшие мероприятия без ограничения по количеству
-    # Фильтруем только активные мероприятия, которые еще не прошли
-    upcoming_events = []
-    events = Event.objects.filter(status=EventStatus.ACTIVE).order_by('date', 'time')
+    # Получаем первую страницу ближайших мероприятий, остальные подгружаются по мере прокрутки
+    upcoming_events, next_cursor = get_upcoming_page()
     
-    # Проверяем каждое мероприятие
-    for event in events:
-        if not event.is_past():
-            upcoming_events.append(event)
+    # Города, в которых есть непрошедшие мероприятия, для фильтра афиши
+    event_cities = City.objects.filter(
+        Exists(Event.objects.upcoming().filter(city=OuterRef('pk')))
+    ).order_by('name')
     
     # Получаем активные туры (увеличиваем лимит, так как нет отдельной страницы списка)
-    all_tours = Tour.objects.filter(is_active=True).order_by('-created_at')
-    tours = []
+    # Оставляем только туры, у которых есть хотя бы одно непрошедшее мероприятие (не более 6)
+    tours = attach_city_names(list(
+        Tour.objects.filter(is_active=True).order_by('-created_at').with_upcoming_events().cards()[:6]
+    ))
     
-    # Фильтруем туры, оставляя только те, у которых есть хотя бы одно непрошедшее мероприятие
-    for tour in all_tours:
-        # Получаем связанные мероприятия
-        tour_events = tour.events.filter(status=EventStatus.ACTIVE)
-        has_upcoming_events = False
-        
-        # Проверяем каждое мероприятие
-        for event in tour_events:
-            if not event.is_past():
-                has_upcoming_events = True
-                break
-        
-        # Если у тура есть непрошедшие мероприятия, добавляем его в список
-        if has_upcoming_events:
-            tours.append(tour)
-            if len(tours) >= 6:  # Ограничиваем количество туров до 6
-                break
+    # Состав афиши, списка городов и туров меняется, когда ближайшее мероприятие уходит в архив
+    expire_at(request, Event.objects.upcoming().earliest_archive_at())
     
     # Получаем часто задаваемые вопросы (все, так как нет отдельной страницы)
     questions = Question.objects.all().order_by('position')
@@ -56,57 +50,53 @@ def index(request):
     context = {
         'banners': banners,
         'upcoming_events': upcoming_events,
+        'next_cursor': next_cursor,
+        'event_cities': event_cities,
         'tours': tours,
         'questions': questions,
     }
     return render(request, 'core/index.html', context)
 
+ARCHIVE_PAGE_SIZE = 24
+
+@cache_public_page
 def archive(request):
     """Страница архива мероприятий"""
-    # Получаем все прошедшие мероприятия
-    past_events = []
-    all_events = Event.objects.filter(status=EventStatus.ACTIVE).order_by('-date', '-time')
-    
-    # Получаем ближайшие мероприятия для отображения ссылки в меню
-    upcoming_events = []
-    events = Event.objects.filter(status=EventStatus.ACTIVE).order_by('date', 'time')
-    
-    # Заполняем список прошедших мероприятий
-    for event in all_events:
-        if event.is_past():
-            past_events.append(event)
-    
-    # Заполняем список предстоящих мероприятий
-    for event in events:
-        if not event.is_past():
-            upcoming_events.append(event)
-            if len(upcoming_events) >= 12:
-                break
-    
-    # Получаем активные туры для отображения ссылки в меню
-    all_tours = Tour.objects.filter(is_active=True).order_by('-created_at')
-    tours = []
-    
-    # Фильтруем туры, оставляя только те, у которых есть хотя бы одно непрошедшее мероприятие
-    for tour in all_tours:
-        # Получаем связанные мероприятия
-        tour_events = tour.events.filter(status=EventStatus.ACTIVE)
-        has_upcoming_events = False
-        
-        # Проверяем каждое мероприятие
-        for event in tour_events:
-            if not event.is_past():
-                has_upcoming_events = True
-                break
-        
-        # Если у тура есть непрошедшие мероприятия, добавляем его в список
-        if has_upcoming_events:
-            tours.append(tour)
-            if len(tours) >= 6:  # Ограничиваем количество туров до 6
-                break
-    
-    # Получаем часто задаваемые вопросы для отображения ссылки в меню
-    questions = Question.objects.all().order_by('position')
+    # Получаем прошедшие мероприятия
+    past_events = Event.objects.past().cards()
+    
+    # Фильтрация по городу и типу мероприятия выполняется в БД
+    selected_city = get_int_param(request, 'city')
+    if selected_city:
+        past_events = past_events.filter(city_id=selected_city)
+    
+    selected_type = get_int_param(request, 'type')
+    if selected_type:
+        past_events = past_events.filter(event_type_id=selected_type)
+    
+    # Архив пополняется, когда в него уходит ближайшее мероприятие с теми же фильтрами
+    upcoming_events = Event.objects.upcoming()
+    if selected_city:
+        upcoming_events = upcoming_events.filter(city_id=selected_city)
+    if selected_type:
+        upcoming_events = upcoming_events.filter(event_type_id=selected_type)
+    expire_at(request, upcoming_events.earliest_archive_at())
+    
+    # Постраничный вывод по курсору (date, time, id) от новых к старым
+    cursor = request.GET.get('after')
+    past_events, next_cursor = keyset_page(past_events, cursor, ARCHIVE_PAGE_SIZE, descending=True)
+    
+    next_page_url = None
+    if next_cursor:
+        query = request.GET.copy()
+        query['after'] = next_cursor
+        next_page_url = f'?{query.urlencode()}'
+    
+    first_page_url = None
+    if cursor:
+        query = request.GET.copy()
+        query.pop('after', None)
+        first_page_url = f'?{query.urlencode()}'
     
     # Города для фильтрации
     cities = City.objects.all().order_by('name')
@@ -117,139 +107,107 @@ def archive(request):
     context = {
         'past_events': past_events,
         'title': 'Архив мероприятий',
-        'upcoming_events': upcoming_events,
-        'tours': tours,
-        'questions': questions,
         'cities': cities,
         'event_types': event_types,
+        'selected_city': selected_city,
+        'selected_type': selected_type,
+        'next_page_url': next_page_url,
+        'first_page_url': first_page_url,
     }
     return render(request, 'core/archive.html', context)
 
-def privacy_policy(request):
-    """Страница политики конфиденциальности"""
-    # Получаем данные для отображения ссылок в меню
-    upcoming_events = []
-    events = Event.objects.filter(status=EventStatus.ACTIVE).order_by('date', 'time')
-    
-    for event in events:
-        if not event.is_past():
-            upcoming_events.append(event)
-            if len(upcoming_events) >= 12:
-                break
+# Ограничения поискового запроса и число результатов в каждом разделе
+SEARCH_MIN_LENGTH = 2
+SEARCH_MAX_LENGTH = 100
+SEARCH_RESULTS_LIMIT = 24
+
+@cache_public_page
+def search(request):
+    """Поиск по предстоящим и архивным мероприятиям и турам"""
+    query = request.GET.get('q', '').strip()[:SEARCH_MAX_LENGTH]
     
-    all_tours = Tour.objects.filter(is_active=True).order_by('-created_at')
+    upcoming_events = []
+    past_events = []
     tours = []
-    
-    # Фильтруем туры, оставляя только те, у которых есть хотя бы одно непрошедшее мероприятие
-    for tour in all_tours:
-        # Получаем связанные мероприятия
-        tour_events = tour.events.filter(status=EventStatus.ACTIVE)
-        has_upcoming_events = False
-        
-        # Проверяем каждое мероприятие
-        for event in tour_events:
-            if not event.is_past():
-                has_upcoming_events = True
-                break
+    if len(query) >= SEARCH_MIN_LENGTH:
+        # Сначала самые релевантные, при равной релевантности - по дате
+        upcoming_events = list(
+            Event.objects.upcoming().search(query).cards()
+            .order_by('-rank', 'date', 'time')[:SEARCH_RESULTS_LIMIT]
+        )
+        past_events = list(
+            Event.objects.past().search(query).cards()
+            .order_by('-rank', '-date', '-time')[:SEARCH_RESULTS_LIMIT]
+        )
+        tours = attach_city_names(list(
+            Tour.objects.filter(is_active=True).with_upcoming_events().search(query).cards()
+            .order_by('-rank', '-created_at')[:SEARCH_RESULTS_LIMIT]
+        ))
         
-        # Если у тура есть непрошедшие мероприятия, добавляем его в список
-        if has_upcoming_events:
-            tours.append(tour)
-            if len(tours) >= 6:  # Ограничиваем количество туров до 6
-                break
-    
-    questions = Question.objects.all().order_by('position')
+        # Результаты меняются, когда найденное мероприятие уходит в архив
+        expire_at(request, Event.objects.upcoming().matching(query).earliest_archive_at())
     
     context = {
-        'title': 'Политика конфиденциальности',
+        'title': 'Поиск',
+        'query': query,
         'upcoming_events': upcoming_events,
+        'past_events': past_events,
         'tours': tours,
-        'questions': questions,
+        'min_length': SEARCH_MIN_LENGTH,
+    }
+    return render(request, 'core/search.html', context)
+
+SUGGEST_LIMIT = 8
+
+def suggest(request):
+    """Подсказки при вводе поискового запроса (JSON). Отвечает из индекса в памяти процесса"""
+    query = request.GET.get('q', '').strip()[:SEARCH_MAX_LENGTH]
+    results = get_suggestions(query, SUGGEST_LIMIT) if len(query) >= SEARCH_MIN_LENGTH else []
+    response = JsonResponse({'results': results})
+    # Повторные нажатия тех же клавиш браузер обслужит из своего кэша
+    response['Cache-Control'] = 'public, max-age=60'
+    return response
+
+@cache_public_page
+def privacy_policy(request):
+    """Страница политики конфиденциальности"""
+    # Данные для ссылок в меню добавляет контекстный процессор navigation
+    context = {
+        'title': 'Политика конфиденциальности',
     }
     return render(request, 'core/privacy_policy.html', context)
 
+@cache_public_page
 def terms_of_service(request):
     """Страница пользовательского соглашения"""
-    # Получаем данные для отображения ссылок в меню
-    upcoming_events = []
-    events = Event.objects.filter(status=EventStatus.ACTIVE).order_by('date', 'time')
-    
-    for event in events:
-        if not event.is_past():
-            upcoming_events.append(event)
-            if len(upcoming_events) >= 12:
-                break
-    
-    all_tours = Tour.objects.filter(is_active=True).order_by('-created_at')
-    tours = []
-    
-    # Фильтруем туры, оставляя только те, у которых есть хотя бы одно непрошедшее мероприятие
-    for tour in all_tours:
-        # Получаем связанные мероприятия
-        tour_events = tour.events.filter(status=EventStatus.ACTIVE)
-        has_upcoming_events = False
-        
-        # Проверяем каждое мероприятие
-        for event in tour_events:
-            if not event.is_past():
-                has_upcoming_events = True
-                break
-        
-        # Если у тура есть непрошедшие мероприятия, добавляем его в список
-        if has_upcoming_events:
-            tours.append(tour)
-            if len(tours) >= 6:  # Ограничиваем количество туров до 6
-                break
-    
-    questions = Question.objects.all().order_by('position')
-    
+    # Данные для ссылок в меню добавляет контекстный процессор navigation
     context = {
         'title': 'Пользовательское соглашение',
-        'upcoming_events': upcoming_events,
-        'tours': tours,
-        'questions': questions,
     }
     return render(request, 'core/terms_of_service.html', context)
 
 def custom_404(request, exception):
     """Страница 404 ошибки"""
-    # Получаем данные для отображения ссылок в меню
-    upcoming_events = []
-    events = Event.objects.filter(status=EventStatus.ACTIVE).order_by('date', 'time')
-    
-    for event in events:
-        if not event.is_past():
-            upcoming_events.append(event)
-            if len(upcoming_events) >= 12:
-                break
-    
-    all_tours = Tour.objects.filter(is_active=True).order_by('-created_at')
-    tours = []
-    
-    # Фильтруем туры, оставляя только те, у которых есть хотя бы одно непрошедшее мероприятие
-    for tour in all_tours:
-        # Получаем связанные мероприятия
-        tour_events = tour.events.filter(status=EventStatus.ACTIVE)
-        has_upcoming_events = False
-        
-        # Проверяем каждое мероприятие
-        for event in tour_events:
-            if not event.is_past():
-                has_upcoming_events = True
-                break
-        
-        # Если у тура есть непрошедшие мероприятия, добавляем его в список
-        if has_upcoming_events:
-            tours.append(tour)
-            if len(tours) >= 6:  # Ограничиваем количество туров до 6
-                break
-    
-    questions = Question.objects.all().order_by('position')
-    
+    # Данные для ссылок в меню добавляет контекстный процессор navigation
     context = {
         'title': 'Страница не найдена',
-        'upcoming_events': upcoming_events,
-        'tours': tours,
-        'questions': questions,
     }
     return render(request, 'core/404.html', context, status=404)
+
+def expire_sitemap(request):
+    # Состав разделов меняется, когда ближайшее мероприятие уходит в архив
+    expire_at(request, Event.objects.upcoming().earliest_archive_at())
+
+@cache_public_page
+def sitemap_index(request):
+    """Индекс карты сайта со ссылками на разделы и их страницы"""
+    response = sitemap_views.index(request, SITEMAPS, sitemap_url_name='sitemap_section')
+    expire_sitemap(request)
+    return response.render()
+
+@cache_public_page
+def sitemap_section(request, section):
+    """Страница раздела карты сайта"""
+    response = sitemap_views.sitemap(request, SITEMAPS, section=section)
+    expire_sitemap(request)
+    return response.render()
@@ -1,6 +1,7 @@
 from pathlib import Path
 import os
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Загружаем .env
@@ -45,12 +46,16 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
+    'django.contrib.sitemaps',
     'corsheaders',
     'core',
     'events',
     'tours',
     'banners',
     'faq',
+    'jobs',
+    'api',
 ]
 
 MIDDLEWARE = [
@@ -79,6 +84,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.site_info',
+                'core.context_processors.navigation',
             ],
         },
     },
@@ -94,6 +100,30 @@ DATABASES = {
     )
 }
 
+# Кэш Redis общий для web и worker: версии данных, сбрасываемые фоновыми задачами,
+# должны быть видны всем процессам. Локальная память допустима только при отладке
+REDIS_URL = os.environ.get('REDIS_URL')
+if not REDIS_URL and not DEBUG:
+    raise ImproperlyConfigured('REDIS_URL обязателен при DEBUG=False')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'elemevent',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Максимальное время жизни закэшированных публичных страниц (секунды).
+# Страницы с мероприятиями истекают раньше, в момент ухода ближайшего мероприятия в архив
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', 86400))
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -121,6 +151,28 @@ WHITENOISE_ALLOW_ALL_ORIGINS = True
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Загруженные файлы именуются по хэшу содержимого (см. core/storage.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'core.storage.HashedMediaStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
 SERVE_MEDIA_IN_PRODUCTION = os.environ.get('SERVE_MEDIA_IN_PRODUCTION', 'False').lower() == 'true'
 
+# Способ отдачи медиа-файлов (см. core/media.py):
+# 'x-accel' - передача через nginx по X-Accel-Redirect, 'django' - FileResponse с поддержкой Range
+MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'django')
+MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+# Создавать ли AVIF-варианты изображений в дополнение к WebP (требует поддержки AVIF в Pillow)
+IMAGE_VARIANTS_AVIF = os.environ.get('IMAGE_VARIANTS_AVIF', 'False').lower() == 'true'
+
+# Выполнять фоновые задачи в текущем процессе вместо очереди (см. jobs/queue.py).
+# В продакшене задачи выполняет отдельный сервис worker (manage.py runworker)
+JOBS_EAGER = os.environ.get('JOBS_EAGER', str(DEBUG)).lower() == 'true'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
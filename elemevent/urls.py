@@ -18,8 +18,8 @@ from django.contrib import admin
 from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
-from django.views.static import serve
 from core.views import custom_404
+from core.media import serve_media
 
 # Маршруты приложений
 urlpatterns = [
@@ -27,6 +27,7 @@ urlpatterns = [
     path('', include('core.urls')),
     path('events/', include('events.urls')),
     path('tours/', include('tours.urls')),
+    path('api/v1/', include('api.urls')),
 ]
 
 # Добавляем маршруты для статических файлов
@@ -35,10 +36,11 @@ if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
-# Всегда добавляем маршрут для медиа-файлов, даже в продакшн-режиме
+# Маршрут для медиа-файлов в продакшн-режиме: передачу файла выполняет nginx
+# (X-Accel-Redirect) или, без nginx, FileResponse с поддержкой Range и ETag
 if settings.SERVE_MEDIA_IN_PRODUCTION:
     urlpatterns += [
-        re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
+        re_path(r'^media/(?P<path>.*)$', serve_media),
     ]
 
 # Регистрируем обработчик 404 ошибки
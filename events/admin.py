@@ -2,15 +2,20 @@ from django.contrib import admin
 from .models import Event, City, EventType, AgeRestriction, EventStatus, EventPush, EventAdvertising
 from django.contrib import messages
 from django.utils.text import slugify
-from django.core.files.base import ContentFile
-from django.db.models import ProtectedError
-from django.utils import timezone
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef, ProtectedError, Q
+from django.db.models.functions import Now
 import uuid
-import os
-import shutil
-from django.conf import settings
 from django.utils.html import format_html
-from django.utils.safestring import mark_safe
+from django.db import transaction
+from core.caching import bump_version
+from core.admin import ImageVariantsAdminMixin
+from core.images import admin_preview
+from core.models import acquire_file_references
+from tours.models import TourEvent
+
+# Запросы короче этой длины ищутся только стандартным поиском по началу слов:
+# триграммное сравнение для них ненадежно
+ADMIN_SEARCH_MIN_LENGTH = 3
 
 @admin.register(City)
 class CityAdmin(admin.ModelAdmin):
@@ -18,14 +23,21 @@ class CityAdmin(admin.ModelAdmin):
     search_fields = ['name']
     list_filter = ['timezone']
     
+    def get_queryset(self, request):
+        # Признак использования вычисляется в том же запросе, что и список
+        return super().get_queryset(request).annotate(
+            has_events=Exists(Event.objects.filter(city=OuterRef('pk')))
+        )
+    
     def is_used(self, obj):
-        is_used = obj.event_set.exists()
+        is_used = obj.has_events
         return format_html(
             '<span style="color: {}">&#x{}</span>',
             '#28a745' if is_used else '#dc3545',
             '2713' if is_used else '2717'
         )
     is_used.short_description = 'Используется'
+    is_used.admin_order_field = 'has_events'
     
     def delete_model(self, request, obj):
         try:
@@ -45,14 +57,21 @@ class EventTypeAdmin(admin.ModelAdmin):
     list_display = ['name', 'is_used']
     search_fields = ['name']
     
+    def get_queryset(self, request):
+        # Признак использования вычисляется в том же запросе, что и список
+        return super().get_queryset(request).annotate(
+            has_events=Exists(Event.objects.filter(event_type=OuterRef('pk')))
+        )
+    
     def is_used(self, obj):
-        is_used = obj.event_set.exists()
+        is_used = obj.has_events
         return format_html(
             '<span style="color: {}">&#x{}</span>',
             '#28a745' if is_used else '#dc3545',
             '2713' if is_used else '2717'
         )
     is_used.short_description = 'Используется'
+    is_used.admin_order_field = 'has_events'
     
     def delete_model(self, request, obj):
         try:
@@ -72,14 +91,21 @@ class AgeRestrictionAdmin(admin.ModelAdmin):
     list_display = ['name', 'is_used']
     search_fields = ['name']
     
+    def get_queryset(self, request):
+        # Признак использования вычисляется в том же запросе, что и список
+        return super().get_queryset(request).annotate(
+            has_events=Exists(Event.objects.filter(age_restriction=OuterRef('pk')))
+        )
+    
     def is_used(self, obj):
-        is_used = obj.event_set.exists()
+        is_used = obj.has_events
         return format_html(
             '<span style="color: {}">&#x{}</span>',
             '#28a745' if is_used else '#dc3545',
             '2713' if is_used else '2717'
         )
     is_used.short_description = 'Используется'
+    is_used.admin_order_field = 'has_events'
     
     def delete_model(self, request, obj):
         try:
@@ -105,7 +131,7 @@ class EventAdvertisingInline(admin.StackedInline):
     extra = 0
 
 @admin.register(Event)
-class EventAdmin(admin.ModelAdmin):
+class EventAdmin(ImageVariantsAdminMixin, admin.ModelAdmin):
     class Media:
         js = (
             'admin/js/slug_warning.js',
@@ -184,12 +210,30 @@ class EventAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        # Город нужен для колонки списка, а признак архива сравнивается с текущим временем в БД
+        return super().get_queryset(request).select_related('city').annotate(
+            is_archived=ExpressionWrapper(Q(archive_at__lt=Now()), output_field=BooleanField())
+        )
+    
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Стандартный поиск по search_fields, дополненный полнотекстовым и триграммным.
+        Короткие запросы и автодополнение (выбор мероприятия в турах) обходятся
+        стандартным поиском, чтобы мероприятия находились по первым буквам названия.
+        """
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        search_term = search_term.strip()
+        if len(search_term) < ADMIN_SEARCH_MIN_LENGTH or request.path.endswith('autocomplete/'):
+            return results, may_have_duplicates
+        return results | queryset.matching(search_term), may_have_duplicates
+    
     def get_section(self, obj):
         """Определяет, в каком разделе отображается мероприятие"""
         if obj.status != EventStatus.ACTIVE:
             return "Скрыто"
             
-        if obj.is_past():
+        if obj.is_archived:
             return "Архив"
             
         return "Афиша"
@@ -198,21 +242,21 @@ class EventAdmin(admin.ModelAdmin):
     def preview_poster(self, obj):
         """Превью постера"""
         if obj.poster:
-            return mark_safe(f'<img src="{obj.poster.url}" style="max-height: 200px;"/>')
+            return admin_preview(obj.poster, 'card', 200)
         return 'Нет изображения'
     preview_poster.short_description = 'Предпросмотр постера'
     
     def preview_cover(self, obj):
         """Превью обложки"""
         if obj.cover:
-            return mark_safe(f'<img src="{obj.cover.url}" style="max-height: 200px;"/>')
+            return admin_preview(obj.cover, 'cover', 200)
         return 'Нет изображения'
     preview_cover.short_description = 'Предпросмотр обложки'
     
     def preview_poster_small(self, obj):
         """Показывает маленькое превью постера в списке"""
         if obj.poster:
-            return format_html('<img src="{}" style="max-height: 50px;"/>', obj.poster.url)
+            return admin_preview(obj.poster, 'card', 50)
         return "Нет постера"
     preview_poster_small.short_description = 'Постер'
     
@@ -225,6 +269,8 @@ class EventAdmin(admin.ModelAdmin):
     get_absolute_url.short_description = 'Ссылка на сайте'
     
     def make_active(self, request, queryset):
+        # Пересчитываем момент архивации, так как update() не вызывает save()
+        queryset.refresh_archive_at()
         updated = queryset.update(status=EventStatus.ACTIVE)
         self.message_user(request, f'Активировано {updated} мероприятий')
     make_active.short_description = "Активировать выбранные мероприятия"
@@ -246,66 +292,48 @@ class EventAdmin(admin.ModelAdmin):
     
     def duplicate_event(self, request, queryset):
         """Действие для дублирования выбранных мероприятий"""
-        for event in queryset:
-            # Запоминаем туры, связанные с мероприятием
-            tours = list(event.tours.all())
-            
-            # Запоминаем пути к исходным изображениям
-            poster_path = None
-            cover_path = None
-            
-            if event.poster and hasattr(event.poster, 'path'):
-                poster_path = event.poster.path
-            
-            if event.cover and hasattr(event.cover, 'path'):
-                cover_path = event.cover.path
-            
-            # Создаем копию мероприятия
-            event.pk = None
-            
-            # Временно очищаем поля изображений
-            original_poster = event.poster
-            original_cover = event.cover
-            event.poster = None
-            event.cover = None
-            
-            # Генерируем новый случайный slug
-            unique_id = str(uuid.uuid4())[:8]
-            event.slug = f"{slugify(event.title)}-{unique_id}"
-            
-            # Добавляем '(копия)' к названию
-            event.title = f"{event.title} (копия)"
-            event.status = EventStatus.DRAFT  # Новая копия всегда создается как черновик
-            
-            # Сохраняем новое мероприятие
-            event.save()
-            
-            # Копируем изображения
-            if poster_path and os.path.exists(poster_path):
-                self._copy_image(poster_path, event, 'poster', 'events/posters')
+        # Город нужен для вычисления момента архивации копий
+        events = list(queryset.select_related('city'))
+        copies = {}
+        
+        with transaction.atomic():
+            for event in events:
+                original_pk = event.pk
+                
+                # Создаем копию мероприятия. Изображения не копируются: копия ссылается на те же файлы,
+                # а учет ссылок на них ведет core.StoredFile
+                event.pk = None
+                
+                # Генерируем новый случайный slug
+                unique_id = str(uuid.uuid4())[:8]
+                event.slug = f"{slugify(event.title)}-{unique_id}"
+                
+                # Добавляем '(копия)' к названию
+                event.title = f"{event.title} (копия)"
+                event.status = EventStatus.DRAFT  # Новая копия всегда создается как черновик
+                
+                # bulk_create не вызывает save(), поэтому момент архивации вычисляем здесь
+                event.archive_at = event.compute_archive_at()
+                copies[original_pk] = event
             
-            if cover_path and os.path.exists(cover_path):
-                self._copy_image(cover_path, event, 'cover', 'events/covers')
+            # Сохраняем все копии одним запросом
+            Event.objects.bulk_create(copies.values())
             
             # Восстанавливаем связи с турами
-            for tour in tours:
-                tour.events.add(event)
+            links = TourEvent.objects.filter(event__in=copies).values_list('tour_id', 'event_id')
+            TourEvent.objects.bulk_create([
+                TourEvent(tour_id=tour_id, event=copies[event_id]) for tour_id, event_id in links
+            ])
             
-        messages.success(request, f"Успешно создано {queryset.count()} копий мероприятий")
+            # Сигналы при массовом создании не отправляются: учитываем ссылки на файлы,
+            # заполняем поисковый вектор и сбрасываем кэши сами
+            acquire_file_references(copies.values())
+            Event.objects.filter(pk__in=[event.pk for event in copies.values()]).refresh_search_vector()
+            bump_version('events', 'tours')
+        
+        messages.success(request, f"Успешно создано {len(copies)} копий мероприятий")
     duplicate_event.short_description = "Дублировать выбранные мероприятия"
     
-    def _copy_image(self, source_path, event, field_name, target_dir):
-        filename, ext = os.path.splitext(os.path.basename(source_path))
-        new_filename = f"{uuid.uuid4().hex}{ext}"
-        new_relative_path = os.path.join(target_dir, new_filename)
-        new_full_path = os.path.join(settings.MEDIA_ROOT, target_dir, new_filename)
-        
-        os.makedirs(os.path.dirname(new_full_path), exist_ok=True)
-        shutil.copy2(source_path, new_full_path)
-        
-        setattr(event, field_name, new_relative_path)
-        event.save()
-
     def get_colored_status(self, obj):
         """Отображает статус мероприятия с соответствующим цветом"""
         colors = {
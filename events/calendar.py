@@ -0,0 +1,262 @@
+"""
+Календари мероприятий в формате iCalendar (RFC 5545) для подписки.
+
+Календарь отдается потоком: строки формируются по мере чтения мероприятий из БД,
+и весь файл не собирается в памяти. Блоки VTIMEZONE вычисляются один раз на часовой
+пояс и год и кэшируются на весь процесс. Состояние календаря (название, время
+последнего изменения и отпечаток состава мероприятий) хранится в кэше с версиями данных,
+поэтому повторный опрос обычно стоит одного обращения к кэшу и ответа 304.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Max
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from core.caching import get_versions
+from core.projections import url_by_slug
+from .models import Event, EventStatus
+from .timezone_utils import get_zone
+
+# Сколько дней прошедшие мероприятия остаются в календаре
+PAST_DAYS = 30
+
+# Как часто клиентам календарей предлагается обновлять подписку
+REFRESH_INTERVAL = 'PT1H'
+MAX_AGE = 15 * 60
+
+PRODID = '-//elemevent//Afisha//RU'
+
+# Группы данных, от которых зависит содержимое календарей
+CALENDAR_VERSION_GROUPS = ('events', 'tours', 'cities')
+
+STATUSES = {
+    EventStatus.ACTIVE: 'CONFIRMED',
+    EventStatus.STOP: 'TENTATIVE',
+    EventStatus.CANCEL: 'CANCELLED',
+}
+
+
+def escape_text(value):
+    """Экранирует значение текстового свойства"""
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+
+def fold_line(line):
+    """Разбивает строку длиннее 75 октетов на строки продолжения"""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    start = 0
+    limit = 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Не разрываем многобайтовый символ UTF-8
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start = end
+        limit = 74  # строка продолжения начинается с пробела
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_offset(offset):
+    seconds = int(offset.total_seconds())
+    sign = '-' if seconds < 0 else '+'
+    hours, rest = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f'{sign}{hours:02}{minutes:02}' + (f'{seconds:02}' if seconds else '')
+
+
+def format_utc(moment):
+    return moment.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _transition(zone, start, end):
+    """Находит с точностью до секунды момент смены смещения между start и end (UTC)"""
+    before = start.astimezone(zone).utcoffset()
+    while end - start > timedelta(seconds=1):
+        middle = start + (end - start) / 2
+        if middle.astimezone(zone).utcoffset() == before:
+            start = middle
+        else:
+            end = middle
+    return end.replace(microsecond=0)
+
+
+def _observance(zone, moment, offset_from):
+    local = moment.astimezone(zone)
+    kind = 'DAYLIGHT' if local.dst() else 'STANDARD'
+    # DTSTART указывается в местном времени, действовавшем до перехода
+    onset = (moment + offset_from).replace(tzinfo=None)
+    return [
+        f'BEGIN:{kind}',
+        f'DTSTART:{onset:%Y%m%dT%H%M%S}',
+        f'TZOFFSETFROM:{format_offset(offset_from)}',
+        f'TZOFFSETTO:{format_offset(local.utcoffset())}',
+        f'TZNAME:{escape_text(local.tzname())}',
+        f'END:{kind}',
+    ]
+
+
+@lru_cache(maxsize=None)
+def vtimezone(name, year):
+    """
+    Блок VTIMEZONE для часового пояса с переходами от начала прошлого года
+    на три года вперед. Переходы находятся по ежедневной выборке смещения
+    и уточняются двоичным поиском.
+    """
+    zone = get_zone(name)
+    if zone is None:
+        return ''
+    start = datetime(year - 1, 1, 1, tzinfo=dt_timezone.utc)
+    end = datetime(year + 3, 1, 1, tzinfo=dt_timezone.utc)
+
+    offset = start.astimezone(zone).utcoffset()
+    lines = ['BEGIN:VTIMEZONE', f'TZID:{name}', *_observance(zone, start, offset)]
+    moment = start
+    while moment < end:
+        following = moment + timedelta(days=1)
+        following_offset = following.astimezone(zone).utcoffset()
+        if following_offset != offset:
+            lines += _observance(zone, _transition(zone, moment, following), offset)
+            offset = following_offset
+        moment = following
+    lines.append('END:VTIMEZONE')
+    return ''.join(fold_line(line) for line in lines)
+
+
+def window_start(now=None):
+    """Начало окна календаря: полночь (UTC) за PAST_DAYS дней до текущего момента"""
+    now = now or timezone.now()
+    return (now - timedelta(days=PAST_DAYS)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def calendar_events(since=None):
+    """Опубликованные мероприятия, которые еще не ушли в архив или ушли недавно"""
+    return Event.objects.exclude(status=EventStatus.DRAFT).filter(archive_at__gte=since or window_start())
+
+
+def event_lines(request, event):
+    """Компонент VEVENT для словаря мероприятия"""
+    location = ', '.join(part for part in (event['venue'], event['address'], event['city_name']) if part)
+    url = request.build_absolute_uri(event['url'])
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:event-{event['pk']}@{request.get_host()}",
+        f"DTSTAMP:{format_utc(event['updated_at'])}",
+        f"LAST-MODIFIED:{format_utc(event['updated_at'])}",
+        f"DTSTART;TZID={event['timezone_name']}:{datetime.combine(event['date'], event['time']):%Y%m%dT%H%M%S}",
+        # Продолжительность не хранится, берется время до архивирования
+        f"DURATION:PT{event['archive_delay']}H",
+        f"SUMMARY:{escape_text(event['title'])}",
+        f'LOCATION:{escape_text(location)}',
+        f'DESCRIPTION:{escape_text(url)}',
+        f'URL:{url}',
+        f"STATUS:{STATUSES.get(event['status'], 'CONFIRMED')}",
+        'END:VEVENT',
+    ]
+    return ''.join(fold_line(line) for line in lines)
+
+
+def iter_calendar(request, name, events):
+    """Построчно формирует календарь: заголовок, часовые пояса городов, мероприятия"""
+    header = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name)}',
+        f'REFRESH-INTERVAL;VALUE=DURATION:{REFRESH_INTERVAL}',
+        f'X-PUBLISHED-TTL:{REFRESH_INTERVAL}',
+    ]
+    yield ''.join(fold_line(line) for line in header)
+
+    year = timezone.now().year
+    zones = events.order_by().values_list('city__timezone', flat=True).distinct()
+    for zone_name in sorted(zones):
+        yield vtimezone(zone_name, year)
+
+    rows = events.order_by('date', 'time', 'pk').values(
+        'pk', 'title', 'date', 'time', 'venue', 'address', 'status', 'archive_delay', 'updated_at',
+        city_name=F('city__name'),
+        timezone_name=F('city__timezone'),
+        url=url_by_slug('event_detail'),
+    )
+    for event in rows.iterator(chunk_size=500):
+        yield event_lines(request, event)
+
+    yield fold_line('END:VCALENDAR')
+
+
+def set_cache_headers(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = f'public, max-age={MAX_AGE}'
+    return response
+
+
+def calendar_response(request, feed_key, load):
+    """
+    Отдает календарь с проверкой If-None-Match/If-Modified-Since.
+
+    load(since) возвращает (название календаря, выборка мероприятий) или None,
+    если календаря нет. Название, время последнего изменения и отпечаток списка
+    мероприятий кэшируются с версиями данных и началом окна календаря, поэтому при повторном
+    опросе без изменений БД не используется.
+    """
+    since = window_start()
+    versions = get_versions(*CALENDAR_VERSION_GROUPS)
+    suffix = '.'.join(f'{name}{versions[name]}' for name in CALENDAR_VERSION_GROUPS)
+    key = f'calendar:{suffix}:{feed_key}:{since:%Y%m%d}'
+
+    feed = None
+    state = cache.get(key)
+    if state is None:
+        feed = load(since)
+        state = {}
+        if feed is not None:
+            name, events = feed
+            last = events.order_by().aggregate(last=Max('updated_at'))['last']
+            # Замена мероприятия в туре не меняет ни количество, ни время изменения,
+            # поэтому в ETag входит отпечаток самого списка
+            pks = events.order_by('pk').values_list('pk', flat=True)
+            members = hashlib.md5(','.join(map(str, pks)).encode()).hexdigest()
+            state = {'name': name, 'last': last, 'members': members}
+        cache.set(key, state, settings.PAGE_CACHE_TIMEOUT)
+    if not state:
+        raise Http404
+
+    # Города не имеют времени изменения, поэтому их версия входит в ETag
+    parts = [state['name'], str(state['last']), state['members'], f'{since:%Y%m%d}', str(versions['cities'])]
+    etag = quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+    last_modified = int(state['last'].timestamp()) if state['last'] else None
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return set_cache_headers(not_modified, etag, last_modified)
+
+    if feed is None:
+        feed = load(since)
+        if feed is None:
+            raise Http404
+    name, events = feed
+    response = StreamingHttpResponse(iter_calendar(request, name, events), content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = f'inline; filename="{feed_key}.ics"'
+    return set_cache_headers(response, etag, last_modified)
@@ -0,0 +1,54 @@
+"""
+RSS и Atom ленты новых опубликованных мероприятий.
+Элементы строятся из легкой выборки values() с готовыми адресами страниц.
+"""
+from django.contrib.syndication.views import Feed
+from django.db.models import F
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+
+from core.projections import url_by_slug
+from .models import Event, EventStatus
+
+# Количество мероприятий в ленте
+FEED_SIZE = 30
+
+
+class LatestEventsFeed(Feed):
+    title = 'Новые мероприятия'
+    description = 'Недавно опубликованные мероприятия афиши'
+
+    def link(self):
+        return reverse('index')
+
+    def items(self):
+        return Event.objects.filter(status=EventStatus.ACTIVE).order_by('-created_at', '-pk').values(
+            'pk', 'title', 'date', 'time', 'venue', 'created_at', 'updated_at',
+            city_name=F('city__name'),
+            url=url_by_slug('event_detail'),
+        )[:FEED_SIZE]
+
+    def item_title(self, item):
+        return item['title']
+
+    def item_description(self, item):
+        return f"{item['city_name']}, {item['venue']}, {item['date']:%d.%m.%Y} {item['time']:%H:%M}"
+
+    def item_link(self, item):
+        return item['url']
+
+    def item_guid(self, item):
+        return f"event-{item['pk']}"
+
+    item_guid_is_permalink = False
+
+    def item_pubdate(self, item):
+        return item['created_at']
+
+    def item_updateddate(self, item):
+        return item['updated_at']
+
+
+class LatestEventsAtomFeed(LatestEventsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestEventsFeed.description
@@ -68,4 +68,43 @@ def migrate_age_restrictions_from_events(apps, schema_editor):
         if event.age_restriction:
             age_restriction_obj, _ = AgeRestriction.objects.get_or_create(name=event.age_restriction)
             event.age_restriction_new = age_restriction_obj
-            event.save(update_fields=['age_restriction_new']) 
\ No newline at end of file
+            event.save(update_fields=['age_restriction_new'])
+
+def fill_event_archive_at(apps, schema_editor):
+    """
+    Заполняет поле archive_at у существующих мероприятий.
+    Используется в data migration.
+    """
+    import pytz
+    from datetime import datetime, timedelta
+    
+    Event = apps.get_model('events', 'Event')
+    
+    events = list(Event.objects.select_related('city'))
+    for event in events:
+        try:
+            event_timezone = pytz.timezone(event.city.timezone)
+            event_datetime = event_timezone.localize(datetime.combine(event.date, event.time))
+            event.archive_at = (event_datetime + timedelta(hours=event.archive_delay)).astimezone(pytz.utc)
+        except Exception:
+            event.archive_at = None
+    
+    Event.objects.bulk_update(events, ['archive_at'], batch_size=500)
+
+def fill_event_search_vector(apps, schema_editor):
+    """
+    Заполняет поисковый вектор у существующих мероприятий (см. EventQuerySet.refresh_search_vector).
+    Используется в data migration.
+    """
+    from django.contrib.postgres.search import SearchVector
+    from django.db.models import OuterRef, Subquery
+    
+    Event = apps.get_model('events', 'Event')
+    City = apps.get_model('events', 'City')
+    
+    city_name = Subquery(City.objects.filter(pk=OuterRef('city_id')).order_by().values('name')[:1])
+    Event.objects.update(search_vector=(
+        SearchVector('title', weight='A', config='russian')
+        + SearchVector(city_name, 'venue', weight='B', config='russian')
+        + SearchVector('description', weight='C', config='russian')
+    ))
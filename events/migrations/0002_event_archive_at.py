@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:56
+
+from django.db import migrations, models
+from events.migration_utils import fill_event_archive_at
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='archive_at',
+            field=models.DateTimeField(editable=False, help_text='Вычисляется автоматически из даты, времени, часового пояса города и времени до архивирования', null=True, verbose_name='Время архивирования'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['status', 'archive_at'], name='event_status_archive_at_idx'),
+        ),
+        migrations.RunPython(fill_event_archive_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:20
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+from events.migration_utils import fill_event_search_vector
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_event_status_date_time_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='event',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Вычисляется автоматически из названия, города, площадки и описания', null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='event_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='event_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(fill_event_search_vector, migrations.RunPython.noop),
+    ]
@@ -2,12 +2,22 @@ from django.db import models
 from django.utils.text import slugify
 from django.urls import reverse
 from django.utils import timezone
-from django.db.models.signals import pre_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField, TrigramWordSimilarity
 import uuid
-import pytz
 import os
-from datetime import datetime, timedelta
+from core.caching import bump_version, VersionedQuerySet
+from core.models import ImageFilesMixin, remember_file_names, update_file_references, release_file_references
+from core.projections import url_by_slug, media_url
+from .timezone_utils import compute_archive_at
+
+# Конфигурация полнотекстового поиска PostgreSQL (морфология русского языка)
+SEARCH_CONFIG = 'russian'
+
+# Поля, от которых зависит поисковый вектор мероприятия
+SEARCH_FIELDS = {'title', 'venue', 'description', 'city'}
 
 def get_random_image_path(instance, filename):
     """Генерирует случайное имя файла, сохраняя расширение оригинального файла"""
@@ -32,6 +42,17 @@ class City(models.Model):
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        # Запоминаем прежние часовой пояс и название, чтобы пересчитать мероприятия города
+        old = None
+        if self.pk:
+            old = City.objects.filter(pk=self.pk).values('timezone', 'name').first()
+        super().save(*args, **kwargs)
+        if old is not None and old['timezone'] != self.timezone:
+            Event.objects.filter(city=self).refresh_archive_at()
+        if old is not None and old['name'] != self.name:
+            Event.objects.filter(city=self).refresh_search_vector()
 
 class EventType(models.Model):
     """Модель типа мероприятия"""
@@ -70,7 +91,90 @@ class TicketSystemType(models.TextChoices):
     TICKETSCLOUD = 'TICKETSCLOUD', 'TicketsCloud'
     RADARIO = 'RADARIO', 'Radario'
 
-class Event(models.Model):
+class EventQuerySet(VersionedQuerySet):
+    """Выборки мероприятий с фильтрацией по моменту архивации на стороне БД"""
+    version_groups = ('events',)
+
+    def upcoming(self, now=None):
+        """
+        Активные мероприятия, которые еще не ушли в архив, ближайшие первыми.
+        now - момент или выражение (например, Now()), по умолчанию текущее время
+        """
+        if now is None:
+            now = timezone.now()
+        return self.filter(
+            models.Q(archive_at__gte=now) | models.Q(archive_at__isnull=True),
+            status=EventStatus.ACTIVE,
+        ).order_by('date', 'time')
+
+    def past(self, now=None):
+        """
+        Активные мероприятия, которые уже ушли в архив, последние первыми.
+        now - момент или выражение (например, Now()), по умолчанию текущее время
+        """
+        if now is None:
+            now = timezone.now()
+        return self.filter(
+            status=EventStatus.ACTIVE,
+            archive_at__lt=now,
+        ).order_by('-date', '-time')
+
+    def cards(self):
+        """
+        Легкая выборка для карточек: словари только с нужными полями,
+        названием города и готовыми адресами страницы и постера
+        """
+        return self.values(
+            'pk', 'slug', 'title', 'date', 'time', 'venue', 'poster',
+            'city_id', 'updated_at', 'archive_at',
+            city_name=models.F('city__name'),
+            url=url_by_slug('event_detail'),
+            poster_url=media_url('poster'),
+        )
+
+    def earliest_archive_at(self):
+        """Ближайший момент архивации среди мероприятий выборки"""
+        return self.order_by().aggregate(value=models.Min('archive_at'))['value']
+
+    def latest_archive_at(self):
+        """Самый поздний момент архивации среди мероприятий выборки"""
+        return self.order_by().aggregate(value=models.Max('archive_at'))['value']
+
+    def refresh_archive_at(self):
+        """Пересчитывает archive_at для всех мероприятий выборки"""
+        events = list(self.select_related('city').only('id', 'date', 'time', 'archive_delay', 'city__timezone'))
+        for event in events:
+            event.archive_at = event.compute_archive_at()
+        return Event.objects.bulk_update(events, ['archive_at'], batch_size=500)
+
+    def refresh_search_vector(self):
+        """
+        Пересчитывает поисковый вектор для всех мероприятий выборки одним запросом UPDATE.
+        Вес слов: название - A, город и площадка - B, описание - C.
+        """
+        city_name = models.Subquery(City.objects.filter(pk=models.OuterRef('city_id')).order_by().values('name')[:1])
+        return self.update(search_vector=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(city_name, 'venue', weight='B', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+        ))
+
+    def matching(self, text):
+        """
+        Мероприятия, найденные по тексту: полнотекстовый поиск по вектору (индекс GIN)
+        или нечеткое совпадение с названием для опечаток и начала слов (индекс pg_trgm)
+        """
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+        return self.filter(models.Q(search_vector=query) | models.Q(title__trigram_word_similar=text))
+
+    def search(self, text):
+        """Результаты matching() с релевантностью в поле rank"""
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+        return self.matching(text).annotate(
+            rank=SearchRank(models.F('search_vector'), query) + TrigramWordSimilarity(text, 'title'),
+        )
+
+class Event(ImageFilesMixin, models.Model):
     """Модель мероприятия"""
     ARCHIVE_DELAY_CHOICES = [
         (0, '0 часов'),
@@ -148,6 +252,18 @@ class Event(models.Model):
         default=EventStatus.DRAFT,
         verbose_name="Статус"
     )
+    archive_at = models.DateTimeField(
+        null=True,
+        editable=False,
+        verbose_name="Время архивирования",
+        help_text="Вычисляется автоматически из даты, времени, часового пояса города и времени до архивирования"
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name="Поисковый вектор",
+        help_text="Вычисляется автоматически из названия, города, площадки и описания"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     
@@ -155,6 +271,17 @@ class Event(models.Model):
         verbose_name = "Мероприятие"
         verbose_name_plural = "Мероприятия"
         ordering = ['-date', '-time']
+        indexes = [
+            models.Index(fields=['status', 'archive_at'], name='event_status_archive_at_idx'),
+            models.Index(fields=['status', 'date', 'time', 'id'], name='event_status_date_time_idx'),
+            GinIndex(fields=['search_vector'], name='event_search_vector_idx'),
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='event_title_trgm_idx'),
+        ]
+    
+    objects = EventQuerySet.as_manager()
+    
+    # Поля изображений и виды их адаптивных вариантов (см. core.images)
+    image_variants = {'poster': 'card', 'cover': 'cover'}
     
     def __str__(self):
         return f"{self.title} - {self.city.name} ({self.date})"
@@ -164,34 +291,35 @@ class Event(models.Model):
             base_slug = slugify(self.title, allow_unicode=True)
             unique_id = str(uuid.uuid4())[:8]
             self.slug = f"{base_slug}-{unique_id}"
+        self.archive_at = self.compute_archive_at()
+        # При частичном сохранении archive_at тоже должен попасть в БД
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'archive_at'}
         super().save(*args, **kwargs)
+        # Вектор включает название города, поэтому вычисляется в БД отдельным запросом
+        if update_fields is None or SEARCH_FIELDS & set(update_fields):
+            Event.objects.filter(pk=self.pk).refresh_search_vector()
     
     def get_absolute_url(self):
         return reverse('event_detail', args=[self.slug])
         
+    def compute_archive_at(self):
+        """Вычисляет момент (UTC), после которого мероприятие уходит в архив"""
+        try:
+            timezone_name = self.city.timezone
+        except City.DoesNotExist:
+            return None
+        return compute_archive_at(self.date, self.time, timezone_name, self.archive_delay)
+
     def is_past(self):
         """Проверяет, прошло ли мероприятие на текущий момент с учетом времени до архивирования"""
-        try:
-            # Получаем текущее время по UTC
-            now = timezone.now()
-            
-            # Получаем часовой пояс мероприятия
-            event_timezone = pytz.timezone(self.city.timezone)
-            
-            # Создаем datetime объект из даты и времени мероприятия
-            event_datetime = datetime.combine(self.date, self.time)
-            
-            # Локализуем время мероприятия в его часовом поясе
-            event_datetime = event_timezone.localize(event_datetime)
-            
-            # Добавляем дополнительное время до архивирования
-            archive_datetime = event_datetime + timedelta(hours=self.archive_delay)
-            
-            # Сравниваем с текущим временем
-            return archive_datetime < now
-        except Exception:
-            # В случае ошибок при работе с часовыми поясами возвращаем False
+        # Сохраненное значение избавляет от загрузки города и вычислений с часовыми поясами
+        archive_datetime = self.archive_at or self.compute_archive_at()
+        if archive_datetime is None:
+            # Мероприятия с некорректным часовым поясом никогда не уходят в архив
             return False
+        return archive_datetime < timezone.now()
 
     def is_visible(self):
         """Проверяет, должно ли мероприятие отображаться в списках"""
@@ -205,40 +333,23 @@ class Event(models.Model):
         """Проверяет, приостановлено ли мероприятие"""
         return self.status == EventStatus.STOP
 
-    def delete_old_image(self, field_name):
-        """Удаляет старое изображение, если оно было заменено"""
-        try:
-            # Получаем путь к старому файлу
-            old_instance = Event.objects.get(pk=self.pk)
-            old_file = getattr(old_instance, field_name)
-            if old_file and old_file != getattr(self, field_name):
-                if os.path.isfile(old_file.path):
-                    os.remove(old_file.path)
-        except (Event.DoesNotExist, ValueError, FileNotFoundError):
-            # Если объект новый или файл не найден, ничего не делаем
-            pass
-
-# Сигнал для обработки удаления старых изображений при обновлении
+# Сигнал для запоминания прежних изображений перед обновлением
 @receiver(pre_save, sender=Event)
-def delete_old_images_on_update(sender, instance, **kwargs):
-    """Обработчик сигнала, который удаляет старые изображения при обновлении события"""
-    if instance.pk:  # Если объект уже существует (не создание нового)
-        instance.delete_old_image('poster')
-        instance.delete_old_image('cover')
+def remember_old_images(sender, instance, **kwargs):
+    """Обработчик сигнала, который запоминает прежние изображения события"""
+    remember_file_names(instance)
 
-# Сигнал для обработки удаления файлов при удалении объекта
+# Сигнал для учета ссылок на изображения и создания их адаптивных вариантов
+@receiver(post_save, sender=Event)
+def update_images_on_save(sender, instance, created, **kwargs):
+    """Обработчик сигнала, который освобождает замененные изображения события и ставит в очередь создание вариантов новых"""
+    update_file_references(instance, created)
+
+# Сигнал для освобождения файлов при удалении объекта
 @receiver(post_delete, sender=Event)
-def delete_files_on_delete(sender, instance, **kwargs):
-    """Обработчик сигнала, который удаляет файлы при удалении события"""
-    # Удаляем файлы постера, если он существует
-    if instance.poster:
-        if os.path.isfile(instance.poster.path):
-            os.remove(instance.poster.path)
-    
-    # Удаляем файлы обложки, если она существует
-    if instance.cover:
-        if os.path.isfile(instance.cover.path):
-            os.remove(instance.cover.path)
+def release_files_on_delete(sender, instance, **kwargs):
+    """Обработчик сигнала, который освобождает изображения удаленного события"""
+    release_file_references(instance)
 
 class EventPush(models.Model):
     event = models.OneToOneField('Event', on_delete=models.CASCADE, related_name='push')
@@ -271,3 +382,19 @@ class EventAdvertising(models.Model):
 
     def __str__(self):
         return f'Реклама для {self.event}'
+
+# Сигнал для инвалидации кэша при изменении мероприятий и связанных с ними данных
+@receiver([post_save, post_delete], sender=Event)
+@receiver([post_save, post_delete], sender=City)
+@receiver([post_save, post_delete], sender=EventType)
+@receiver([post_save, post_delete], sender=AgeRestriction)
+@receiver([post_save, post_delete], sender=EventPush)
+@receiver([post_save, post_delete], sender=EventAdvertising)
+def bump_events_version(sender, **kwargs):
+    """Обработчик сигнала, который сбрасывает кэши, зависящие от мероприятий"""
+    bump_version('events')
+
+@receiver([post_save, post_delete], sender=City)
+def bump_cities_version(sender, **kwargs):
+    """Обработчик сигнала, который сбрасывает карточки с названиями городов"""
+    bump_version('cities')
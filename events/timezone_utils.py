@@ -0,0 +1,68 @@
+"""
+Утилиты для работы с часовыми поясами мероприятий.
+Объекты часовых поясов кэшируются на весь процесс.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.utils import timezone
+
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    """Возвращает часовой пояс по имени или None, если имя некорректно"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        return None
+
+
+def compute_archive_at(date, time, timezone_name, archive_delay):
+    """Вычисляет момент (UTC), после которого мероприятие уходит в архив"""
+    zone = get_zone(timezone_name)
+    if zone is None or date is None or time is None:
+        return None
+
+    # Локализуем время мероприятия в часовом поясе города и переводим в UTC
+    event_datetime = datetime.combine(date, time).replace(tzinfo=zone).astimezone(dt_timezone.utc)
+    return event_datetime + timedelta(hours=archive_delay)
+
+
+def archive_cutoff(timezone_name, archive_delay, now=None):
+    """
+    Возвращает локальное (naive) время города, раньше которого
+    мероприятия с указанным временем до архивирования считаются прошедшими.
+    """
+    zone = get_zone(timezone_name)
+    if zone is None:
+        return None
+    now = now or timezone.now()
+    return (now.astimezone(zone) - timedelta(hours=archive_delay)).replace(tzinfo=None)
+
+
+def split_events(events, now=None):
+    """
+    Разделяет мероприятия на предстоящие и прошедшие.
+    Граница вычисляется один раз для каждой пары (часовой пояс, время до архивирования),
+    дальше выполняется простое сравнение даты и времени.
+    Для мероприятий должен быть загружен город (select_related('city')).
+    """
+    now = now or timezone.now()
+    cutoffs = {}
+    upcoming = []
+    past = []
+
+    for event in events:
+        key = (event.city.timezone, event.archive_delay)
+        if key not in cutoffs:
+            cutoffs[key] = archive_cutoff(*key, now=now)
+        cutoff = cutoffs[key]
+
+        # Мероприятия с некорректным часовым поясом никогда не уходят в архив
+        if cutoff is not None and datetime.combine(event.date, event.time) < cutoff:
+            past.append(event)
+        else:
+            upcoming.append(event)
+
+    return upcoming, past
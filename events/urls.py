@@ -1,6 +1,13 @@
 from django.urls import path, re_path
 from . import views
+from .feeds import LatestEventsFeed, LatestEventsAtomFeed
+from core.caching import cache_public_page
 
 urlpatterns = [
+    path('upcoming/', views.upcoming_events_feed, name='upcoming_events_feed'),
+    path('calendar.ics', views.schedule_calendar, name='schedule_calendar'),
+    path('calendar/<int:city_id>.ics', views.city_calendar, name='city_calendar'),
+    path('feed/rss/', cache_public_page(LatestEventsFeed()), name='events_rss'),
+    path('feed/atom/', cache_public_page(LatestEventsAtomFeed()), name='events_atom'),
     path('<slug:slug>/', views.event_detail, name='event_detail'),
 ] 
\ No newline at end of file
@@ -1,10 +1,13 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.core.paginator import Paginator
 from .models import Event, City, EventType, AgeRestriction, EventStatus
-from django.http import Http404
-from tours.models import Tour
-from faq.models import Question
+from django.http import Http404, HttpResponse
+from django.template.loader import render_to_string
+from core.pagination import keyset_page, get_int_param
+from core.caching import cache_public_page, expire_at
 from django.utils import timezone
+from django.views.decorators.http import require_safe
+from .calendar import calendar_events, calendar_response
 
 def event_list(request):
     """Список всех мероприятий"""
@@ -34,16 +37,7 @@ def event_list(request):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Получаем данные для отображения ссылок в меню
-    upcoming_events = []
-    for event in events:
-        if not event.is_past():
-            upcoming_events.append(event)
-            if len(upcoming_events) >= 12:
-                break
-    
-    tours = Tour.objects.filter(is_active=True).order_by('-created_at')[:6]
-    questions = Question.objects.all().order_by('position')
+    # Данные для ссылок в меню добавляет контекстный процессор navigation
     
     # Города для фильтрации
     cities = City.objects.all().order_by('name')
@@ -54,9 +48,6 @@ def event_list(request):
     context = {
         'page_obj': page_obj,
         'title': 'Мероприятия',
-        'upcoming_events': upcoming_events,
-        'tours': tours,
-        'questions': questions,
         'cities': cities,
         'event_types': event_types,
         'selected_city': city_id,
@@ -64,6 +55,7 @@ def event_list(request):
     }
     return render(request, 'events/event_list.html', context)
 
+@cache_public_page
 def event_detail(request, slug):
     """Детальная страница мероприятия"""
     # Получаем мероприятие по slug
@@ -76,40 +68,64 @@ def event_detail(request, slug):
     # Проверяем, прошло ли мероприятие
     is_past = event.is_past()
     
-    # Получаем другие мероприятия из того же города, сортируем по дате (ближайшие)
-    all_related_events = Event.objects.filter(
-        city=event.city, 
-        status=EventStatus.ACTIVE
-    ).exclude(id=event.id).order_by('date', 'time')
-    
-    # Фильтруем прошедшие мероприятия
-    related_events = []
-    for related_event in all_related_events:
-        if not related_event.is_past():
-            related_events.append(related_event)
-            if len(related_events) >= 3:  # Ограничиваем количество до 3
-                break
+    # Получаем другие непрошедшие мероприятия из того же города (не более 3 ближайших)
+    related_events = list(Event.objects.upcoming().filter(
+        city=event.city
+    ).exclude(id=event.id).cards()[:3])
     
-    # Получаем данные для отображения ссылок в меню
-    events = Event.objects.filter(status=EventStatus.ACTIVE).order_by('date', 'time')
-    upcoming_events = []
-    for e in events:
-        if not e.is_past():
-            upcoming_events.append(e)
-            if len(upcoming_events) >= 12:
-                break
+    # Страница устаревает, когда в архив уходит само мероприятие или одно из связанных
+    if not is_past:
+        expire_at(request, event.archive_at)
+    expire_at(request, *(related['archive_at'] for related in related_events))
     
-    tours = Tour.objects.filter(is_active=True).order_by('-created_at')[:6]
-    questions = Question.objects.all().order_by('position')
+    # Данные для ссылок в меню добавляет контекстный процессор navigation
     
     context = {
         'event': event,
         'related_events': related_events,
-        'upcoming_events': upcoming_events,
-        'tours': tours,
-        'questions': questions,
         'is_archive': is_past and event.status == EventStatus.ACTIVE,  # Архив только для активных мероприятий
         'is_stopped': event.is_stopped(),  # Флаг для приостановленных мероприятий
         'is_cancelled': event.is_cancelled(),  # Флаг для отмененных мероприятий
     }
     return render(request, 'events/event_detail.html', context)
+
+UPCOMING_PAGE_SIZE = 12
+
+def get_upcoming_page(city_id=None, cursor=None):
+    """Возвращает страницу ближайших мероприятий и курсор следующей страницы"""
+    events = Event.objects.upcoming().cards()
+    if city_id:
+        events = events.filter(city_id=city_id)
+    return keyset_page(events, cursor, UPCOMING_PAGE_SIZE)
+
+@cache_public_page
+def upcoming_events_feed(request):
+    """HTML-фрагмент со следующей страницей ближайших мероприятий для главной страницы"""
+    events, next_cursor = get_upcoming_page(
+        city_id=get_int_param(request, 'city'),
+        cursor=request.GET.get('after'),
+    )
+    expire_at(request, *(event['archive_at'] for event in events))
+    
+    html = render_to_string('events/components/event_cards.html', {'events': events})
+    response = HttpResponse(html)
+    # Курсор следующей страницы передается в заголовке, пустое значение означает конец списка
+    response['X-Next-Cursor'] = next_cursor or ''
+    return response
+
+@require_safe
+def schedule_calendar(request):
+    """Календарь iCalendar со всеми мероприятиями"""
+    def load(since):
+        return 'Афиша', calendar_events(since)
+    return calendar_response(request, 'schedule', load)
+
+@require_safe
+def city_calendar(request, city_id):
+    """Календарь iCalendar с мероприятиями города"""
+    def load(since):
+        city_name = City.objects.filter(pk=city_id).values_list('name', flat=True).first()
+        if city_name is None:
+            return None
+        return f'Афиша: {city_name}', calendar_events(since).filter(city_id=city_id)
+    return calendar_response(request, f'city-{city_id}', load)
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from core.caching import bump_version
 
 # Create your models here.
 
@@ -17,3 +20,9 @@ class Question(models.Model):
     
     def __str__(self):
         return self.title
+
+# Сигнал для инвалидации кэша при изменении вопросов
+@receiver([post_save, post_delete], sender=Question)
+def bump_faq_version(sender, **kwargs):
+    """Обработчик сигнала, который сбрасывает кэши, зависящие от вопросов"""
+    bump_version('faq')
@@ -0,0 +1,26 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import Job, JobStatus
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['task', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at']
+    list_filter = ['status', 'task']
+    search_fields = ['task']
+    readonly_fields = ['task', 'args', 'status', 'attempts', 'locked_at', 'last_error', 'created_at', 'updated_at']
+    list_per_page = 50
+    actions = ['retry_jobs']
+
+    def has_add_permission(self, request):
+        # Задачи ставятся в очередь только кодом приложения
+        return False
+
+    def retry_jobs(self, request, queryset):
+        updated = queryset.exclude(status=JobStatus.RUNNING).update(
+            status=JobStatus.PENDING,
+            attempts=0,
+            run_at=timezone.now(),
+            locked_at=None,
+        )
+        self.message_user(request, f'Повторно поставлено в очередь {updated} задач')
+    retry_jobs.short_description = "Повторить выбранные задачи"
@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import connections
+import multiprocessing
+import signal
+import threading
+
+from jobs.queue import claim_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркер фоновых задач (см. jobs.queue)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='Количество потоков, выполняющих задачи в каждом процессе (по умолчанию 4)',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Количество процессов воркера (по умолчанию 1)',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Пауза между проверками пустой очереди в секундах (по умолчанию 1)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и завершиться',
+        )
+
+    def handle(self, *args, **options):
+        threads = max(1, options['threads'])
+        processes = max(1, options['processes'])
+        poll_interval = options['poll_interval']
+        once = options['once']
+
+        if processes == 1:
+            self.work(threads, poll_interval, once)
+            return
+
+        # Дочерние процессы не должны наследовать соединения с БД
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=self.work, args=(threads, poll_interval, once))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+
+        def stop_workers(signum, frame):
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+
+        signal.signal(signal.SIGTERM, stop_workers)
+        signal.signal(signal.SIGINT, stop_workers)
+        for worker in workers:
+            worker.join()
+
+    def work(self, threads, poll_interval, once):
+        """Цикл выборки и выполнения задач; завершается по SIGTERM/SIGINT после текущей пачки"""
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+        self.stdout.write(f"Воркер запущен, потоков: {threads}")
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='job') as pool:
+            while not stop.is_set():
+                jobs = claim_jobs(threads)
+                if not jobs:
+                    if once:
+                        break
+                    stop.wait(poll_interval)
+                    continue
+
+                for job, error in zip(jobs, pool.map(run_job, jobs)):
+                    if error is None:
+                        done += 1
+                    else:
+                        failed += 1
+                        self.stderr.write(f"{job} (попытка {job.attempts} из {job.max_attempts}):\n{error}")
+
+        connections.close_all()
+        self.stdout.write(self.style.SUCCESS(f"Воркер остановлен. Выполнено задач: {done}, с ошибкой: {failed}"))
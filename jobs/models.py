@@ -0,0 +1,43 @@
+from django.db import models
+from django.utils import timezone
+
+
+class JobStatus(models.TextChoices):
+    """Статусы фоновой задачи"""
+    PENDING = 'PENDING', 'В очереди'
+    RUNNING = 'RUNNING', 'Выполняется'
+    FAILED = 'FAILED', 'Ошибка'
+
+
+class Job(models.Model):
+    """
+    Фоновая задача. Выполненные задачи удаляются из таблицы,
+    поэтому в ней остаются только ожидающие, выполняемые и завершившиеся ошибкой.
+    """
+    task = models.CharField(max_length=255, verbose_name="Задача")
+    args = models.JSONField(default=list, blank=True, verbose_name="Аргументы")
+    status = models.CharField(
+        max_length=10,
+        choices=JobStatus.choices,
+        default=JobStatus.PENDING,
+        verbose_name="Статус"
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name="Максимум попыток")
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="Запустить не раньше")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="Взята в работу")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        ordering = ['run_at', 'id']
+        indexes = [
+            # Выборка воркером следующих задач
+            models.Index(fields=['status', 'run_at', 'id'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk}"
@@ -0,0 +1,120 @@
+"""
+Очередь фоновых задач в PostgreSQL.
+
+Задача - функция, помеченная декоратором @task. enqueue() сохраняет ее вызов
+в таблицу Job в текущей транзакции: при откате задача исчезает вместе с данными,
+а воркер видит ее только после фиксации. Воркеры (manage.py runworker) выбирают
+задачи через SELECT ... FOR UPDATE SKIP LOCKED, поэтому несколько воркеров
+не мешают друг другу и не берут одну задачу дважды.
+
+При JOBS_EAGER = True (по умолчанию в режиме отладки) задачи выполняются
+в фоновом потоке текущего процесса сразу после фиксации транзакции.
+"""
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.background import run_in_background
+from .models import Job, JobStatus
+
+# Задержка перед повтором удвоением растет от базовой до максимальной (секунды)
+RETRY_BASE_DELAY = 10
+RETRY_MAX_DELAY = 3600
+
+# Задача, которая выполняется дольше, считается брошенной упавшим воркером
+LOCK_TIMEOUT = timedelta(minutes=30)
+
+
+def task(func):
+    """Помечает функцию как фоновую задачу; аргументы должны сериализоваться в JSON"""
+    func.task_name = f'{func.__module__}.{func.__name__}'
+    return func
+
+
+def get_task(name):
+    """Возвращает функцию задачи по имени"""
+    func = import_string(name)
+    if getattr(func, 'task_name', None) != name:
+        raise ValueError(f'{name} не является фоновой задачей')
+    return func
+
+
+def enqueue(func, *args, delay=None):
+    """
+    Ставит вызов задачи в очередь. Возвращает созданную задачу
+    или None, если задача будет выполнена в текущем процессе (JOBS_EAGER).
+    """
+    if getattr(settings, 'JOBS_EAGER', False):
+        transaction.on_commit(lambda: run_in_background(func, *args))
+        return None
+    run_at = timezone.now()
+    if delay:
+        run_at += timedelta(seconds=delay)
+    return Job.objects.create(task=func.task_name, args=list(args), run_at=run_at)
+
+
+def retry_delay(attempts):
+    """Задержка (секунды) перед следующей попыткой"""
+    return min(RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), RETRY_MAX_DELAY)
+
+
+def claim_jobs(limit):
+    """
+    Забирает до limit готовых к выполнению задач и отмечает их как выполняемые.
+    Заодно подбирает задачи, брошенные воркерами, которые завершились аварийно.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=JobStatus.PENDING, run_at__lte=now)
+                | Q(status=JobStatus.RUNNING, locked_at__lt=now - LOCK_TIMEOUT)
+            )
+            .order_by('run_at', 'id')[:limit]
+        )
+        if jobs:
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=JobStatus.RUNNING,
+                locked_at=now,
+                attempts=F('attempts') + 1,
+                updated_at=now,
+            )
+    for job in jobs:
+        job.status = JobStatus.RUNNING
+        job.locked_at = now
+        job.attempts += 1
+    return jobs
+
+
+def run_job(job):
+    """
+    Выполняет задачу. Успешная задача удаляется, неуспешная откладывается
+    до следующей попытки или помечается ошибкой после исчерпания попыток.
+    Возвращает текст ошибки или None.
+    """
+    close_old_connections()
+    try:
+        if job.attempts > job.max_attempts:
+            # Задача уже роняла воркер заданное число раз
+            raise RuntimeError('Превышено число попыток')
+        get_task(job.task)(*job.args)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            changes = {'status': JobStatus.FAILED}
+        else:
+            changes = {'status': JobStatus.PENDING, 'run_at': now + timedelta(seconds=retry_delay(job.attempts))}
+        Job.objects.filter(pk=job.pk).update(last_error=error, locked_at=None, updated_at=now, **changes)
+        return error
+    else:
+        Job.objects.filter(pk=job.pk).delete()
+        return None
+    finally:
+        close_old_connections()
@@ -1,20 +1,4 @@
-function removeDuplicateCities(cityOptions) {
-	if (!cityOptions || cityOptions.length === 0) return
-
-	const cities = new Set()
-	cityOptions.forEach(option => {
-		const cityName = option.getAttribute('data-city')
-		if (cityName === 'all') {
-			return // Skip the "All cities" option
-		}
-
-		if (cities.has(cityName)) {
-			option.remove()
-		} else {
-			cities.add(cityName)
-		}
-	})
-}
+import { showCityEvents } from './events-feed.js'
 
 export function initCitySelector() {
 	const citySelector = document.getElementById('citySelector')
@@ -22,12 +6,9 @@ export function initCitySelector() {
 	const citySearch = document.getElementById('citySearch')
 	const cityOptions = document.querySelectorAll('.city-option')
 	const selectedCityText = document.getElementById('selectedCity')
-	const eventCards = document.querySelectorAll('.event-card')
 	const noEventsMessage = document.getElementById('noEventsMessage')
 
 	if (citySelector && cityDropdown) {
-		removeDuplicateCities(cityOptions)
-
 		// Обработчик кнопки выбора города
 		const citySelectorButton = citySelector.querySelector('button')
 		if (citySelectorButton) {
@@ -71,26 +52,16 @@ export function initCitySelector() {
 
 		// Выбор города
 		cityOptions.forEach(option => {
-			option.addEventListener('click', function () {
+			option.addEventListener('click', async function () {
 				const selectedCity = this.getAttribute('data-city')
 				if (selectedCityText) {
-					selectedCityText.textContent = selectedCity === 'all' ? 'Все города' : selectedCity
+					selectedCityText.textContent = selectedCity === 'all' ? 'Все города' : this.textContent
 				}
 				cityDropdown.classList.add('hidden')
 				citySelectorButton.classList.remove('active')
 
-				// Фильтрация событий
-				let visibleEvents = 0
-				if (eventCards && eventCards.length > 0) {
-					eventCards.forEach(card => {
-						const cityName = card.getAttribute('data-city')
-						if (!cityName) return
-
-						const shouldShow = selectedCity === 'all' || cityName.toLowerCase() === selectedCity.toLowerCase()
-						card.classList.toggle('hidden', !shouldShow)
-						if (shouldShow) visibleEvents++
-					})
-				}
+				// Загружаем мероприятия выбранного города с сервера
+				const visibleEvents = await showCityEvents(selectedCity)
 
 				// Отображение сообщения, если нет событий
 				if (noEventsMessage) {
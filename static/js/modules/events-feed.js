@@ -0,0 +1,91 @@
+// Подгрузка ближайших мероприятий на главной странице по курсору
+let currentCity = ''
+let loading = false
+// Текущий запрос: при смене города он отменяется, чтобы ответ не попал в новый список
+let controller = null
+
+function getContainer() {
+	return document.getElementById('events-container')
+}
+
+function startRequest() {
+	if (controller) controller.abort()
+	controller = new AbortController()
+	return controller
+}
+
+function finishRequest(request) {
+	if (controller !== request) return
+	controller = null
+	loading = false
+}
+
+async function fetchEvents(container, cursor, signal) {
+	const params = new URLSearchParams()
+	if (currentCity) params.set('city', currentCity)
+	if (cursor) params.set('after', cursor)
+
+	const response = await fetch(`${container.dataset.feedUrl}?${params.toString()}`, {
+		headers: { 'X-Requested-With': 'XMLHttpRequest' },
+		signal,
+	})
+	if (!response.ok) throw new Error(`HTTP ${response.status}`)
+
+	return {
+		html: await response.text(),
+		nextCursor: response.headers.get('X-Next-Cursor') || '',
+	}
+}
+
+export async function loadMoreEvents() {
+	const container = getContainer()
+	if (!container || loading || !container.dataset.nextCursor) return
+
+	loading = true
+	const request = startRequest()
+	try {
+		const { html, nextCursor } = await fetchEvents(container, container.dataset.nextCursor, request.signal)
+		if (request.signal.aborted) return
+		container.insertAdjacentHTML('beforeend', html)
+		container.dataset.nextCursor = nextCursor
+	} catch (error) {
+		if (error.name !== 'AbortError') console.error('Не удалось загрузить мероприятия:', error)
+	} finally {
+		finishRequest(request)
+	}
+}
+
+export async function showCityEvents(city) {
+	const container = getContainer()
+	if (!container) return 0
+
+	currentCity = city === 'all' ? '' : city
+	loading = true
+	// Отменяет и подгрузку следующей страницы, и загрузку предыдущего выбранного города
+	const request = startRequest()
+	try {
+		const { html, nextCursor } = await fetchEvents(container, '', request.signal)
+		if (request.signal.aborted) return container.querySelectorAll('.event-card').length
+		container.innerHTML = html
+		container.dataset.nextCursor = nextCursor
+	} catch (error) {
+		if (error.name !== 'AbortError') console.error('Не удалось загрузить мероприятия:', error)
+	} finally {
+		finishRequest(request)
+	}
+	return container.querySelectorAll('.event-card').length
+}
+
+export function initEventsFeed() {
+	const sentinel = document.getElementById('events-sentinel')
+	if (!sentinel || !getContainer() || !('IntersectionObserver' in window)) return
+
+	// Подгружаем следующую страницу, когда конец списка приближается к экрану
+	const observer = new IntersectionObserver(
+		entries => {
+			if (entries.some(entry => entry.isIntersecting)) loadMoreEvents()
+		},
+		{ rootMargin: '600px 0px' }
+	)
+	observer.observe(sentinel)
+}
@@ -0,0 +1,70 @@
+// Подсказки при вводе поискового запроса
+const SUGGEST_DELAY = 150
+const MIN_LENGTH = 2
+
+export function initSearchSuggest() {
+	const input = document.getElementById('searchInput')
+	const list = document.getElementById('searchSuggestions')
+	if (!input || !list) return
+
+	let timer = null
+	let controller = null
+
+	function hide() {
+		list.classList.add('hidden')
+		list.innerHTML = ''
+	}
+
+	function render(results) {
+		list.innerHTML = ''
+		results.forEach(item => {
+			const link = document.createElement('a')
+			link.href = item.url
+			link.className = 'block w-full text-left px-4 py-2 rounded-[8px] transition lg:hover:bg-muted lg:hover:text-primary'
+			link.textContent = item.label
+			if (item.details) {
+				const details = document.createElement('span')
+				details.className = 'text-muted-foreground'
+				details.textContent = ` — ${item.details}`
+				link.appendChild(details)
+			}
+			list.appendChild(link)
+		})
+		list.classList.toggle('hidden', results.length === 0)
+	}
+
+	async function load(query) {
+		// Отменяем предыдущий запрос, чтобы не показать устаревшие подсказки
+		if (controller) controller.abort()
+		controller = new AbortController()
+		try {
+			const response = await fetch(`${input.dataset.suggestUrl}?${new URLSearchParams({ q: query })}`, {
+				signal: controller.signal,
+			})
+			if (!response.ok) throw new Error(`HTTP ${response.status}`)
+			const data = await response.json()
+			render(data.results)
+		} catch (error) {
+			if (error.name !== 'AbortError') console.error('Не удалось загрузить подсказки:', error)
+		}
+	}
+
+	input.addEventListener('input', function () {
+		clearTimeout(timer)
+		const query = this.value.trim()
+		if (query.length < MIN_LENGTH) {
+			hide()
+			return
+		}
+		timer = setTimeout(() => load(query), SUGGEST_DELAY)
+	})
+
+	input.addEventListener('keydown', function (e) {
+		if (e.key === 'Escape') hide()
+	})
+
+	// Закрытие подсказок при клике вне поля
+	document.addEventListener('click', function (e) {
+		if (e.target !== input && !list.contains(e.target)) hide()
+	})
+}
@@ -1,13 +1,17 @@
 import { initCarousel } from './modules/carousel.js'
 import { initCitySelector } from './modules/city-selector.js'
+import { initEventsFeed } from './modules/events-feed.js'
 import { initFaq } from './modules/faq.js'
 import { initMobileMenu } from './modules/mobile-menu.js'
+import { initSearchSuggest } from './modules/search-suggest.js'
 import { initUtmHandler } from './modules/utm-handler.js'
 
 document.addEventListener('DOMContentLoaded', function () {
 	initCitySelector()
+	initEventsFeed()
 	initCarousel()
 	initFaq()
 	initMobileMenu()
+	initSearchSuggest()
 	initUtmHandler()
 })
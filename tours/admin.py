@@ -2,14 +2,14 @@ from django.contrib import admin
 from .models import Tour, TourEvent
 from django.contrib import messages
 from django.utils.text import slugify
-from django.core.files.base import ContentFile
-from django.utils import timezone
+from django.db.models import Count
 import uuid
-import os
-import shutil
-from django.conf import settings
-from django.utils.safestring import mark_safe
 from django.utils.html import format_html
+from django.db import transaction
+from core.caching import bump_version
+from core.admin import ImageVariantsAdminMixin
+from core.images import admin_preview
+from core.models import acquire_file_references
 
 class TourEventInline(admin.TabularInline):
     model = TourEvent
@@ -18,11 +18,11 @@ class TourEventInline(admin.TabularInline):
     classes = ['collapse']
 
 @admin.register(Tour)
-class TourAdmin(admin.ModelAdmin):
+class TourAdmin(ImageVariantsAdminMixin, admin.ModelAdmin):
     class Media:
         js = ('admin/js/slug_warning.js',)
 
-    list_display = ['preview_poster_small', 'title', 'get_colored_status', 'get_section']
+    list_display = ['preview_poster_small', 'title', 'get_colored_status', 'get_section', 'get_events_count']
     list_filter = ['is_active', 'created_at']
     search_fields = ['title', 'events__title']
     prepopulated_fields = {}  # Отключаем автоматическое заполнение slug
@@ -57,25 +57,29 @@ class TourAdmin(admin.ModelAdmin):
     )
     
     def get_events_count(self, obj):
-        return obj.events.count()
+        return obj.events_count
     get_events_count.short_description = 'Количество мероприятий'
+    get_events_count.admin_order_field = 'events_count'
+    
+    def get_queryset(self, request):
+        # Признак наличия непрошедших мероприятий и число мероприятий вычисляются в том же запросе
+        return super().get_queryset(request).with_upcoming_flag().annotate(
+            events_count=Count('tour_events', distinct=True)
+        )
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по триграммному индексу названия и поисковому вектору мероприятий тура"""
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.matching(search_term), False
     
     def get_section(self, obj):
         """Определяет раздел, в котором отображается тур"""
         if not obj.is_active:
             return "Скрыто"
-            
-        # Получаем активные мероприятия тура
-        active_events = obj.events.filter(status='ACTIVE')
         
-        # Проверяем, есть ли хотя бы одно непрошедшее мероприятие
-        has_upcoming_events = False
-        for event in active_events:
-            if not event.is_past():
-                has_upcoming_events = True
-                break
-        
-        if has_upcoming_events:
+        if obj.has_upcoming_events:
             return "Афиша"
         return "Скрыто"
     get_section.short_description = "Раздел"
@@ -92,82 +96,58 @@ class TourAdmin(admin.ModelAdmin):
     
     def duplicate_tour(self, request, queryset):
         """Действие для дублирования выбранных туров"""
-        for tour in queryset:
-            # Запоминаем мероприятия
-            events = list(tour.events.all())
-            
-            # Запоминаем пути к изображениям
-            poster_path = None
-            cover_path = None
-            
-            if tour.poster and hasattr(tour.poster, 'path'):
-                poster_path = tour.poster.path
-            
-            if tour.cover and hasattr(tour.cover, 'path'):
-                cover_path = tour.cover.path
-            
-            # Создаем копию тура
-            tour.pk = None
-            
-            # Временно очищаем поля изображений
-            original_poster = tour.poster
-            original_cover = tour.cover
-            tour.poster = None
-            tour.cover = None
-            
-            # Генерируем новый slug
-            unique_id = str(uuid.uuid4())[:8]
-            tour.slug = f"{slugify(tour.title)}-{unique_id}"
-            
-            # Добавляем пометку копии
-            tour.title = f"{tour.title} (копия)"
-            tour.is_active = False  # Новая копия всегда неактивна
-            
-            # Сохраняем новый тур
-            tour.save()
-            
-            # Копируем изображения
-            if poster_path and os.path.exists(poster_path):
-                self._copy_image(poster_path, tour, 'poster', 'tours/posters')
+        tours = list(queryset)
+        copies = {}
+        
+        with transaction.atomic():
+            for tour in tours:
+                original_pk = tour.pk
+                
+                # Создаем копию тура. Изображения не копируются: копия ссылается на те же файлы,
+                # а учет ссылок на них ведет core.StoredFile
+                tour.pk = None
+                
+                # Генерируем новый slug
+                unique_id = str(uuid.uuid4())[:8]
+                tour.slug = f"{slugify(tour.title)}-{unique_id}"
+                
+                # Добавляем пометку копии
+                tour.title = f"{tour.title} (копия)"
+                tour.is_active = False  # Новая копия всегда неактивна
+                copies[original_pk] = tour
             
-            if cover_path and os.path.exists(cover_path):
-                self._copy_image(cover_path, tour, 'cover', 'tours/covers')
+            # Сохраняем все копии одним запросом
+            Tour.objects.bulk_create(copies.values())
             
             # Восстанавливаем связи с мероприятиями
-            for event in events:
-                tour.events.add(event)
+            links = TourEvent.objects.filter(tour__in=copies).values_list('tour_id', 'event_id')
+            TourEvent.objects.bulk_create([
+                TourEvent(tour=copies[tour_id], event_id=event_id) for tour_id, event_id in links
+            ])
             
-        messages.success(request, f"Успешно создано {queryset.count()} копий туров")
+            # Сигналы при массовом создании не отправляются: учитываем ссылки на файлы и сбрасываем кэши сами
+            acquire_file_references(copies.values())
+            bump_version('tours')
+        
+        messages.success(request, f"Успешно создано {len(copies)} копий туров")
     duplicate_tour.short_description = "Дублировать выбранные туры"
     
-    def _copy_image(self, source_path, tour, field_name, target_dir):
-        filename, ext = os.path.splitext(os.path.basename(source_path))
-        new_filename = f"{uuid.uuid4().hex}{ext}"
-        new_relative_path = os.path.join(target_dir, new_filename)
-        new_full_path = os.path.join(settings.MEDIA_ROOT, target_dir, new_filename)
-        
-        os.makedirs(os.path.dirname(new_full_path), exist_ok=True)
-        shutil.copy2(source_path, new_full_path)
-        
-        setattr(tour, field_name, new_relative_path)
-        tour.save()
-
     def preview_poster(self, obj):
         if obj.poster:
-            return mark_safe(f'<img src="{obj.poster.url}" style="max-height: 200px;"/>')
+            return admin_preview(obj.poster, 'card', 200)
         return 'Нет изображения'
     preview_poster.short_description = 'Предпросмотр постера'
 
     def preview_cover(self, obj):
         if obj.cover:
-            return mark_safe(f'<img src="{obj.cover.url}" style="max-height: 200px;"/>')
+            return admin_preview(obj.cover, 'cover', 200)
         return 'Нет изображения'
     preview_cover.short_description = 'Предпросмотр обложки'
 
     def preview_poster_small(self, obj):
         """Показывает маленькое превью постера в списке"""
         if obj.poster:
-            return format_html('<img src="{}" style="max-height: 50px;"/>', obj.poster.url)
+            return admin_preview(obj.poster, 'card', 50)
         return "Нет постера"
     preview_poster_small.short_description = 'Постер'
 
@@ -189,4 +169,5 @@ class TourEventAdmin(admin.ModelAdmin):
     list_filter = ['tour', 'event__status']
     search_fields = ['tour__title', 'event__title']
     autocomplete_fields = ['tour', 'event']
+    list_select_related = ['tour', 'event__city']
     readonly_fields = ['created_at']
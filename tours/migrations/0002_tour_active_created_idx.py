@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_event_archive_at'),
+        ('tours', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(fields=['is_active', '-created_at'], name='tour_active_created_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:20
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        # Расширение pg_trgm создается в миграции мероприятий
+        ('events', '0004_event_search_vector'),
+        ('tours', '0002_tour_active_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tour',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='tour_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
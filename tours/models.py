@@ -2,7 +2,12 @@ from django.db import models
 from django.utils.text import slugify
 from django.urls import reverse
 from events.models import Event
-from django.db.models.signals import pre_save, post_delete
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import TrigramWordSimilarity
+from core.caching import bump_version, VersionedQuerySet
+from core.models import ImageFilesMixin, remember_file_names, update_file_references, release_file_references
+from core.projections import url_by_slug, media_url
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 import uuid
 import os
@@ -18,7 +23,52 @@ def get_random_image_path(instance, filename):
         return os.path.join('tours/cards', random_filename)
     return os.path.join('tours/covers', random_filename)
 
-class Tour(models.Model):
+class TourQuerySet(VersionedQuerySet):
+    """Выборки туров"""
+    version_groups = ('tours',)
+
+    def _upcoming_events_exists(self, now=None):
+        """Подзапрос EXISTS: у тура есть непрошедшее активное мероприятие"""
+        return models.Exists(Event.objects.upcoming(now).filter(tour_events__tour=models.OuterRef('pk')))
+
+    def with_upcoming_flag(self, now=None):
+        """Добавляет к турам признак has_upcoming_events"""
+        return self.annotate(has_upcoming_events=self._upcoming_events_exists(now))
+
+    def with_upcoming_events(self, now=None):
+        """Туры, у которых есть хотя бы одно непрошедшее активное мероприятие (один запрос)"""
+        return self.filter(self._upcoming_events_exists(now))
+
+    def matching(self, text):
+        """Туры, найденные по тексту: нечеткое совпадение с названием или найденное мероприятие тура"""
+        events = Event.objects.matching(text).filter(tour_events__tour=models.OuterRef('pk'))
+        return self.filter(models.Q(title__trigram_word_similar=text) | models.Exists(events))
+
+    def search(self, text):
+        """Результаты matching() с релевантностью в поле rank"""
+        return self.matching(text).annotate(rank=TrigramWordSimilarity(text, 'title'))
+
+    def cards(self):
+        """Легкая выборка для карточек: словари с готовыми адресами страницы и постера"""
+        return self.values(
+            'pk', 'slug', 'title', 'poster', 'updated_at',
+            url=url_by_slug('tour_detail'),
+            poster_url=media_url('poster'),
+        )
+
+def attach_city_names(tours):
+    """Добавляет к карточкам туров названия городов их мероприятий (одним запросом)"""
+    cities = {}
+    rows = Event.objects.filter(
+        tour_events__tour__in=[tour['pk'] for tour in tours]
+    ).order_by('-date', '-time').values_list('tour_events__tour', 'city__name')
+    for tour_id, city_name in rows:
+        cities.setdefault(tour_id, []).append(city_name)
+    for tour in tours:
+        tour['city_names'] = cities.get(tour['pk'], [])
+    return tours
+
+class Tour(ImageFilesMixin, models.Model):
     """Модель тура"""
     def _get_upload_path_for_poster(self, filename):
         self._current_image_field = 'poster'
@@ -37,10 +87,19 @@ class Tour(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     
+    objects = TourQuerySet.as_manager()
+    
+    # Поля изображений и виды их адаптивных вариантов (см. core.images)
+    image_variants = {'poster': 'card', 'cover': 'cover'}
+    
     class Meta:
         verbose_name = "Тур"
         verbose_name_plural = "Туры"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', '-created_at'], name='tour_active_created_idx'),
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='tour_title_trgm_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -55,40 +114,23 @@ class Tour(models.Model):
     def get_absolute_url(self):
         return reverse('tour_detail', args=[self.slug])
 
-    def delete_old_image(self, field_name):
-        """Удаляет старое изображение, если оно было заменено"""
-        try:
-            # Получаем путь к старому файлу
-            old_instance = Tour.objects.get(pk=self.pk)
-            old_file = getattr(old_instance, field_name)
-            if old_file and old_file != getattr(self, field_name):
-                if os.path.isfile(old_file.path):
-                    os.remove(old_file.path)
-        except (Tour.DoesNotExist, ValueError, FileNotFoundError):
-            # Если объект новый или файл не найден, ничего не делаем
-            pass
-
-# Сигнал для обработки удаления старых изображений при обновлении
+# Сигнал для запоминания прежних изображений перед обновлением
 @receiver(pre_save, sender=Tour)
-def delete_old_images_on_update(sender, instance, **kwargs):
-    """Обработчик сигнала, который удаляет старые изображения при обновлении тура"""
-    if instance.pk:  # Если объект уже существует (не создание нового)
-        instance.delete_old_image('poster')
-        instance.delete_old_image('cover')
+def remember_old_images(sender, instance, **kwargs):
+    """Обработчик сигнала, который запоминает прежние изображения тура"""
+    remember_file_names(instance)
 
-# Сигнал для обработки удаления файлов при удалении объекта
+# Сигнал для учета ссылок на изображения и создания их адаптивных вариантов
+@receiver(post_save, sender=Tour)
+def update_images_on_save(sender, instance, created, **kwargs):
+    """Обработчик сигнала, который освобождает замененные изображения тура и ставит в очередь создание вариантов новых"""
+    update_file_references(instance, created)
+
+# Сигнал для освобождения файлов при удалении объекта
 @receiver(post_delete, sender=Tour)
-def delete_files_on_delete(sender, instance, **kwargs):
-    """Обработчик сигнала, который удаляет файлы при удалении тура"""
-    # Удаляем файлы постера, если он существует
-    if instance.poster:
-        if os.path.isfile(instance.poster.path):
-            os.remove(instance.poster.path)
-    
-    # Удаляем файлы обложки, если она существует
-    if instance.cover:
-        if os.path.isfile(instance.cover.path):
-            os.remove(instance.cover.path)
+def release_files_on_delete(sender, instance, **kwargs):
+    """Обработчик сигнала, который освобождает изображения удаленного тура"""
+    release_file_references(instance)
 
 class TourEvent(models.Model):
     """Модель связи тура и мероприятия"""
@@ -103,3 +145,11 @@ class TourEvent(models.Model):
     
     def __str__(self):
         return f"{self.tour.title} - {self.event.title}"
+
+# Сигнал для инвалидации кэша при изменении туров и их состава
+@receiver([post_save, post_delete], sender=Tour)
+@receiver([post_save, post_delete], sender=TourEvent)
+@receiver(m2m_changed, sender=TourEvent)
+def bump_tours_version(sender, **kwargs):
+    """Обработчик сигнала, который сбрасывает кэши, зависящие от туров"""
+    bump_version('tours')
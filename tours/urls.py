@@ -4,4 +4,5 @@ from . import views
 urlpatterns = [
     path('', views.tour_list, name='tours'),
     path('<slug:slug>/', views.tour_detail, name='tour_detail'),
+    path('<slug:slug>/calendar.ics', views.tour_calendar, name='tour_calendar'),
 ] 
\ No newline at end of file